@@ -0,0 +1,388 @@
+"""Computer player for soak tests and idle play.
+
+AutoPlayer drives a Game through Game.handle exactly as a person at the
+keyboard would: it reads the prompt the engine is waiting on and types a
+line back. Outside combat it picks up items, equips upgrades, heals, buys
+potions in the village and walks toward the nearest unexplored room. In
+combat it chooses attack, defend, run or potion by expectimax over the
+exact damage distributions of the fight loop.
+
+    python autoplay.py --careers 10 --decisions 20000 --seed 1
+"""
+import argparse
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from main import (
+    DIRECTION_OFFSETS, Game, GameEvent, GameWorld, ItemType, combat_odds,
+    escape_chance, monster_damage_distribution, player_damage_distribution,
+)
+
+# What each way out of a fight is worth to the player, plus HEALTH_VALUE
+# times the fraction of health left. Fleeing leaves the monster in the room,
+# so it is worth much less than winning.
+WIN_VALUE = 1.0
+ESCAPE_VALUE = 0.3
+HEALTH_VALUE = 0.5
+POTION_COST = 0.02
+# Potions beyond this many don't change the plan and only blow up the table
+MAX_PLANNED_POTIONS = 3
+# Fights that plain attacking wins this surely aren't worth solving in full
+SURE_WIN = 0.999
+
+# Solved states per stat tuple: {(attack, defense, ...): ({(player_hp, monster_hp, potions): (value, action)},
+#                                                       {state: expected value after the monster's strike})}
+_policy_tables: Dict[tuple, Tuple[dict, dict]] = {}
+
+def battle_policy(player_hp: int, monster_hp: int, potions: int, attack: int, player_defense: int,
+                  monster_attack: int, monster_defense: int, max_health: int, heal: int,
+                  weather_modifier: float = 1.0, can_run: bool = True) -> Tuple[str, float]:
+    """The best combat action ('a', 'd', 'r' or 'u') and its expected value.
+
+    A round is the player's action followed by the monster's strike, as in
+    enhanced_fight. Every action either ends the fight, spends a potion, or
+    costs the player health, so states only ever get "smaller" and the
+    table is filled depth-first without recursion.
+    """
+    potions = min(potions, MAX_PLANNED_POTIONS)
+    key = (attack, player_defense, monster_attack, monster_defense, max_health, heal, weather_modifier, can_run)
+    tables = _policy_tables.get(key)
+    if tables is None:
+        tables = _policy_tables[key] = ({}, {})
+    table, struck = tables
+    state = (player_hp, monster_hp, potions)
+    solved = table.get(state)
+    if solved is not None:
+        return solved[1], solved[0]
+
+    hits = player_damage_distribution(attack, monster_defense, weather_modifier)
+    strikes = monster_damage_distribution(monster_attack, player_defense)
+    guarded = monster_damage_distribution(monster_attack, player_defense, True)
+    hit_amounts = [damage for damage, _ in hits]
+    strike_amounts = [taken for taken, _ in strikes]
+    guard_amounts = [taken for taken, _ in guarded]
+    escape = escape_chance(monster_attack)
+
+    def after_strike(p_hp, m_hp, k):
+        # Expected value once the monster has struck; shared by every hit
+        # that leaves the monster on m_hp
+        state = (p_hp, m_hp, k)
+        value = struck.get(state)
+        if value is None:
+            value = 0.0
+            for taken, chance in strikes:
+                if p_hp > taken:
+                    value += chance * table[(p_hp - taken, m_hp, k)][0]
+            struck[state] = value
+        return value
+
+    stack = [state]
+    while stack:
+        p_hp, m_hp, k = current = stack[-1]
+        if current in table:
+            stack.pop()
+            continue
+        # States one round away that still need solving
+        missing = []
+        for taken in strike_amounts:
+            if p_hp > taken:
+                for damage in hit_amounts:
+                    if m_hp > damage and (p_hp - taken, m_hp - damage, k) not in table:
+                        missing.append((p_hp - taken, m_hp - damage, k))
+                if (p_hp - taken, m_hp, k) not in table:
+                    missing.append((p_hp - taken, m_hp, k))
+        for taken in guard_amounts:
+            if p_hp > taken and (p_hp - taken, m_hp, k) not in table:
+                missing.append((p_hp - taken, m_hp, k))
+        if k:
+            healed = min(max_health, p_hp + heal)
+            for taken in strike_amounts:
+                if healed > taken and (healed - taken, m_hp, k - 1) not in table:
+                    missing.append((healed - taken, m_hp, k - 1))
+        if missing:
+            stack.extend(missing)
+            continue
+
+        health = HEALTH_VALUE * p_hp / max_health
+        value = 0.0
+        for damage, chance in hits:
+            value += chance * (WIN_VALUE + health if m_hp <= damage else after_strike(p_hp, m_hp - damage, k))
+        best, action = value, "a"
+        value = 0.0
+        for taken, chance in guarded:
+            if p_hp > taken:
+                value += chance * table[(p_hp - taken, m_hp, k)][0]
+        if value > best:
+            best, action = value, "d"
+        if can_run:
+            value = escape * (ESCAPE_VALUE + health) + (1 - escape) * after_strike(p_hp, m_hp, k)
+            if value > best:
+                best, action = value, "r"
+        if k:
+            value = after_strike(min(max_health, p_hp + heal), m_hp, k - 1) - POTION_COST
+            if value > best:
+                best, action = value, "u"
+        table[current] = (best, action)
+        stack.pop()
+
+    value, action = table[state]
+    return action, value
+
+class AutoPlayer:
+    """Plays one Game session; each step() is one decision and one line typed."""
+    # Heal (or go home to rest) below this fraction of max health
+    RETREAT_BELOW = 0.4
+    # Keep this many potions; top up in the village shop when short
+    POTION_STOCK = 3
+    # Don't pick fights in rooms the solver rates below this chance of winning
+    MIN_WIN_CHANCE = 0.9
+
+    def __init__(self, game: Game, max_expansions: int = 4096):
+        self.game = game
+        self.max_expansions = max_expansions
+        self.prompt = None
+        self.route = deque()
+        self.decisions = 0
+        self.fights = 0
+        self.fled_from = None  # room fled from, where running is no use any more
+        self.idle = 0  # decisions left before looking for somewhere to go again
+        self._potion_choice = "1"
+
+    def step(self) -> List[GameEvent]:
+        line = self.decide()
+        events = self.game.handle(line)
+        self.decisions += 1
+        self.prompt = None
+        if self.game.pending:
+            for event in reversed(events):
+                if event.kind == "prompt":
+                    self.prompt = event.text
+                    break
+        for event in events:
+            if event.text == "You successfully fled from battle!":
+                self.fled_from = self.game.player.location
+        return events
+
+    def run(self, decisions: int) -> int:
+        """Play until the session ends or `decisions` lines have been typed."""
+        start = self.decisions
+        while not self.game.game_over and self.decisions - start < decisions:
+            self.step()
+        return self.decisions - start
+
+    def decide(self) -> str:
+        if self.game.pending:
+            return self.answer(self.prompt or "")
+        return self.explore()
+
+    # Prompts
+
+    def answer(self, prompt: str) -> str:
+        if prompt.startswith("\nChoose action"):
+            return self.battle_action()
+        if prompt.startswith("Choose potion"):
+            return self._potion_choice
+        if prompt.startswith("What would you like to buy"):
+            player = self.game.player
+            potion = self.game.world.items_db["health_potion"]
+            if self._potion_count() < self.POTION_STOCK and player.gold >= potion.value:
+                return "1"  # the shop lists health potions first
+            return "0"
+        return "0"
+
+    def battle_action(self) -> str:
+        game, player = self.game, self.game.player
+        room = game.world.get_room(player.location)
+        if not room.monsters:
+            return "a"
+        # Focus on the weakest enemy, planning as if all of them struck as one
+        number, monster = min(enumerate(room.monsters, 1), key=lambda choice: choice[1].health)
+        attack = f"a {number}" if len(room.monsters) > 1 else "a"
+        monster_attack = self._combined_attack(room.monsters)
+        modifier = game.weather_system.get_combat_modifier()
+        if combat_odds(player.health, monster.health, player.get_total_attack(), player.defense,
+                       monster_attack, monster.defense, modifier).win_probability >= SURE_WIN:
+            return attack
+        potions = self._potions()
+        heal = potions[0][1].effect if potions else 0
+        action, _ = battle_policy(player.health, monster.health, self._potion_count(),
+                                  player.get_total_attack(), player.defense,
+                                  monster_attack, monster.defense, player.max_health, heal,
+                                  modifier, can_run=self.fled_from != player.location)
+        if action == "u":
+            self._potion_choice = str(potions[0][0])
+        return attack if action == "a" else action
+
+    def _combined_attack(self, monsters) -> int:
+        # The attack of one monster that hurts as much as all of these together
+        defense = self.game.player.defense
+        if len(monsters) == 1:
+            return monsters[0].attack
+        return defense + sum(max(1, monster.attack - defense) for monster in monsters)
+
+    # Exploration
+
+    def explore(self) -> str:
+        game, player = self.game, self.game.player
+        world = game.world
+        room = world.get_room(player.location)
+        if self.fled_from is not None and self.fled_from != player.location:
+            self.fled_from = None
+        low = player.health < player.max_health * self.RETREAT_BELOW
+
+        if low and self._potions():
+            return f"use {self._potions()[0][1].name}"
+        if room.monsters:
+            self.route.clear()
+            self.fights += 1
+            return "fight"
+        if room.items:
+            item, _ = next(iter(room.items.distinct()))
+            return f"take {item.name}"
+        upgrade = self._upgrade()
+        if upgrade is not None:
+            return f"equip {upgrade.name}"
+        if low:
+            # Monsters roam, so a long walk home hurt is riskier than resting here
+            self.route.clear()
+            return "rest"
+        if (room.special == "shop" and self._potion_count() < self.POTION_STOCK
+                and player.gold >= world.items_db["health_potion"].value):
+            return "shop"
+
+        if not self.route and self.idle:
+            self.idle -= 1
+            return "rest"
+        if not self.route:
+            self.route.extend(self.plan_route())
+        if not self.route:
+            # Nothing in reach worth doing; rest a while before looking again
+            self.idle = 16
+            return "rest"
+        return self.route.popleft()
+
+    def plan_route(self) -> List[str]:
+        """Directions to the nearest unexplored room the player can enter
+        safely, going only through rooms without monsters; failing that, to
+        the monster room the player is likeliest to win in, if that is
+        likely enough."""
+        game, player = self.game, self.game.player
+        world = game.world
+        start = player.location
+        parents = {start: None}
+        queue = deque([start])
+        fights = []
+        expansions = 0
+        while queue and expansions < self.max_expansions:
+            location = queue.popleft()
+            expansions += 1
+            for direction in world.exits(location):
+                dx, dy = DIRECTION_OFFSETS[direction]
+                neighbour = (location[0] + dx, location[1] + dy)
+                if neighbour in parents:
+                    continue
+                parents[neighbour] = (location, direction)
+                monsters = world.get_room(neighbour).monsters
+                if monsters:
+                    # Rooms with monsters are dead ends until cleared
+                    chance = self._win_chance(monsters)
+                    if chance >= self.MIN_WIN_CHANCE and neighbour not in player.explored:
+                        return self._walk(parents, neighbour)
+                    fights.append((chance, neighbour))
+                elif neighbour not in player.explored:
+                    return self._walk(parents, neighbour)
+                else:
+                    queue.append(neighbour)
+
+        if not fights:
+            return []
+        chance, target = max(fights)
+        if chance < self.MIN_WIN_CHANCE:
+            return []
+        return self._walk(parents, target)
+
+    def _win_chance(self, monsters) -> float:
+        player = self.game.player
+        modifier = self.game.weather_system.get_combat_modifier()
+        if len(monsters) == 1:
+            monster = monsters[0]
+            return combat_odds(player.health, monster.health, player.get_total_attack(), player.defense,
+                               monster.attack, monster.defense, modifier).win_probability
+        # Groups get a quick estimate instead: the damage taken while killing
+        # them weakest first at the average hit, against half the player's health
+        taken = rounds = 0
+        for monster in sorted(monsters, key=lambda monster: monster.health):
+            average = sum(damage * chance for damage, chance
+                          in player_damage_distribution(player.get_total_attack(), monster.defense, modifier))
+            rounds += -(-monster.health // max(1, int(average)))
+            taken += (rounds - 1) * max(1, monster.attack - player.defense)
+        return 1.0 if taken <= player.health / 2 else 0.0
+
+    @staticmethod
+    def _walk(parents, goal) -> List[str]:
+        route = []
+        while parents[goal] is not None:
+            goal, direction = parents[goal]
+            route.append(direction)
+        route.reverse()
+        return route
+
+    def _potions(self) -> List[Tuple[int, object]]:
+        # (menu number in the fight's potion prompt, potion), strongest first
+        potions = [item for item, _ in self.game.player.inventory.distinct() if item.type == ItemType.POTION]
+        return sorted(enumerate(potions, 1), key=lambda choice: -choice[1].effect)
+
+    def _potion_count(self) -> int:
+        inventory = self.game.player.inventory
+        return sum(inventory.count(potion) for _, potion in self._potions())
+
+    def _upgrade(self):
+        player = self.game.player
+        best = None
+        for item, _ in player.inventory.distinct():
+            if item.type == ItemType.WEAPON:
+                current = player.equipped_weapon
+            elif item.type == ItemType.ARMOR:
+                current = player.equipped_armor
+            else:
+                continue
+            if item.effect > (current.effect if current else 0) and (best is None or item.effect > best.effect):
+                best = item
+        return best
+
+def play_career(seed: int, decisions: int, radius: Optional[int] = None) -> AutoPlayer:
+    """One fresh character in a fresh world, played for up to `decisions` lines."""
+    game = Game(GameWorld(radius, seed=seed))
+    game.turbo = True
+    game.rng_seed = seed
+    game.rng.seed(seed)
+    game.begin(f"Bot{seed}")
+    agent = AutoPlayer(game)
+    agent.run(decisions)
+    return agent
+
+def main():
+    parser = argparse.ArgumentParser(description="Play Dragon's Quest careers with the computer player")
+    parser.add_argument("--careers", type=int, default=1)
+    parser.add_argument("--decisions", type=int, default=10000, help="lines to type per career at most")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the first career; the rest count up")
+    parser.add_argument("--radius", type=int, default=None, help="bound the world to this radius")
+    args = parser.parse_args()
+
+    print(f"{'Seed':>6} {'Decisions':>9} {'Dec/s':>8} {'Level':>5} {'Gold':>6} {'Explored':>8} {'Fights':>6}  Outcome")
+    total_decisions = total_time = 0
+    for seed in range(args.seed, args.seed + args.careers):
+        start = time.perf_counter()
+        agent = play_career(seed, args.decisions, args.radius)
+        elapsed = time.perf_counter() - start
+        total_decisions += agent.decisions
+        total_time += elapsed
+        player = agent.game.player
+        print(f"{seed:>6} {agent.decisions:>9} {agent.decisions / elapsed:>8,.0f} {player.level:>5} "
+              f"{player.gold:>6} {len(player.explored):>8} {agent.fights:>6}  "
+              f"{'died' if agent.game.game_over else 'alive'}")
+    print(f"{total_decisions:,} decisions in {total_time:.1f}s ({total_decisions / total_time:,.0f}/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Bytes per room: the compact Room layout against the original dict layout.
+
+    python -m benchmarks.bench_memory --rooms 100000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from main import GameWorld, Item, Monster
+
+def legacy_room(room):
+    # The pre-Room representation: a dict of lists holding full dataclass copies
+    return {
+        "type": room.type,
+        "description": room.description,
+        "monsters": [Monster(**monster.template.__dict__) for monster in room.monsters],
+        "items": [Item(**item.__dict__) for item in room.items],
+        "special": room.special,
+    }
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rooms = build(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rooms
+    return (after - before) / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=100_000)
+    args = parser.parse_args()
+
+    world = GameWorld(seed=1)
+    side = int(args.rooms ** 0.5) + 1
+    locations = [(x, y) for x in range(1, side + 1) for y in range(side)][:args.rooms]
+    rooms = [world._generate_room_at(location) for location in locations]
+
+    compact = measure(lambda n: [world._generate_room_at(location) for location in locations[:n]], args.rooms)
+    legacy = measure(lambda n: [legacy_room(room) for room in rooms[:n]], args.rooms)
+
+    print(f"rooms: {args.rooms}")
+    print(f"legacy dict rooms: {legacy:8.1f} bytes/room")
+    print(f"compact rooms:     {compact:8.1f} bytes/room")
+    print(f"saving:            {(1 - compact / legacy) * 100:8.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Load test for server.py: many idle connections plus active scripted clients.
+
+Starts a server in-process on a free port (or targets --host/--port) and
+reports connection setup time and command throughput.
+
+    python -m benchmarks.bench_server --idle 2000 --clients 50 --commands 200
+"""
+import argparse
+import asyncio
+import time
+
+from main import GameWorld
+from server import GameServer
+
+PROMPT = b"] > "
+SCRIPT = ["look", "stats", "i", "n", "s", "e", "w", "help", "weather", "time"]
+
+async def open_session(host, port, name):
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    await reader.readuntil(b": ")
+    writer.write(f"{name}\n".encode())
+    await reader.readuntil(PROMPT)
+    return reader, writer
+
+async def run_client(host, port, index, commands):
+    reader, writer = await open_session(host, port, f"bot{index}")
+    for i in range(commands):
+        writer.write(f"{SCRIPT[i % len(SCRIPT)]}\n".encode())
+        await reader.readuntil(PROMPT)
+    writer.close()
+
+async def run(args):
+    server = None
+    host, port = args.host, args.port
+    if port is None:
+        server = GameServer(GameWorld(seed=1), host, 0, turbo=True)
+        await server.start()
+        port = server.port
+
+    start = time.perf_counter()
+    idle = [await open_session(host, port, f"idle{i}") for i in range(args.idle)]
+    connect_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, i, args.commands) for i in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    total = args.clients * args.commands
+
+    print(f"idle connections:  {len(idle)} opened in {connect_time:.2f}s")
+    print(f"active clients:    {args.clients} x {args.commands} commands")
+    print(f"throughput:        {total / elapsed:.0f} commands/s ({elapsed:.2f}s)")
+
+    for _, writer in idle:
+        writer.close()
+    if server is not None:
+        await server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="existing server to target")
+    parser.add_argument("--idle", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--commands", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
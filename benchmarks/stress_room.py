@@ -0,0 +1,95 @@
+"""Stress test for room-level concurrency control.
+
+Many sessions share one world and all stand in the same room, stocked with
+gems and goblins, fighting and looting from their own threads. At the end
+every gem must be in exactly one inventory and every goblin must have been
+defeated exactly once.
+
+    python -m benchmarks.stress_room --sessions 32 --gems 5000 --goblins 2000
+"""
+import argparse
+import sys
+import threading
+import time
+
+from main import Game, GameWorld, MonsterInstance
+
+ROOM = (7, 7)
+
+def play(game, room, errors, stop):
+    try:
+        while not stop.is_set() and (room.items or room.monsters):
+            game.handle("take diamond")
+            game.handle("f")
+            while game.pending:
+                game.handle("a")
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--gems", type=int, default=5000)
+    parser.add_argument("--goblins", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Switch threads as often as possible to provoke races
+    sys.setswitchinterval(1e-6)
+
+    world = GameWorld(seed=1)
+    room = world.get_room(ROOM)
+    room.monsters = ()
+    room.items = ()
+    diamond = world.items_db["diamond"]
+    for _ in range(args.gems):
+        room.add_item(diamond)
+    for _ in range(args.goblins):
+        room.add_monster(MonsterInstance(world.monsters_db["goblin"]))
+
+    games = []
+    for i in range(args.sessions):
+        game = Game(world)
+        game.turbo = True
+        game.begin(f"bot{i}")
+        game.player.location = ROOM
+        game.player.health = game.player.max_health = 10 ** 9
+        games.append(game)
+
+    kills = [0] * args.sessions
+    original_output = Game.output
+
+    def counting_output(self, text=""):
+        if text.startswith("\n🎉 You defeated"):
+            kills[games.index(self)] += 1
+        original_output(self, text)
+
+    Game.output = counting_output
+    errors, stop = [], threading.Event()
+    threads = [threading.Thread(target=play, args=(game, room, errors, stop)) for game in games]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    Game.output = original_output
+
+    taken = sum(game.player.inventory.count(diamond) for game in games)
+    print(f"sessions: {args.sessions}, elapsed: {elapsed:.2f}s")
+    print(f"diamonds: {taken} taken of {args.gems}, {len(room.items)} left in room")
+    print(f"goblins:  {sum(kills)} kills credited of {args.goblins}, {len(room.monsters)} left in room")
+
+    failures = []
+    if errors:
+        failures.append(f"{len(errors)} sessions raised: {errors[0]!r}")
+    if taken != args.gems or room.items:
+        failures.append("diamonds were duplicated or lost")
+    if sum(kills) != args.goblins:
+        failures.append("goblin kills were credited more or less than once")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
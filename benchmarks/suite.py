@@ -0,0 +1,299 @@
+"""Benchmark suite for the engine's hot paths.
+
+Every benchmark is seeded, so runs on the same machine do the same work.
+Each one is timed `--repeat` times and the fastest run is reported, since
+that is the least affected by other load on the machine. Results go to
+stdout (or --output) as JSON; with --compare they are checked against a
+stored baseline, and the run exits 1 if anything got slower than
+--threshold. Baselines are only comparable on the machine they came from.
+
+    python -m benchmarks.suite                        # JSON results
+    python -m benchmarks.suite --compare benchmarks/baseline.json
+    python -m benchmarks.suite --output benchmarks/baseline.json   # new baseline
+    python -m benchmarks.suite --only fight,craft --quick
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import autoplay
+from main import Game, GameWorld, MonsterInstance
+
+SCRIPT = ["look", "stats", "i", "help", "weather", "time", "recipes", "n", "s", "e", "w", "bogus"]
+
+def make_game(seed=1, world=None):
+    game = Game(world if world is not None else GameWorld(seed=seed))
+    game.turbo = True
+    game.rng_seed = seed
+    game.rng.seed(seed)
+    game.begin("Bench")
+    game.drain_events()
+    return game
+
+def bench_world_generation(radius):
+    """Generate every room of a bounded world of the given radius."""
+    def setup():
+        pass
+
+    def run(_):
+        world = GameWorld(radius=radius, seed=1, max_chunks=1 << 16)
+        for x in range(-radius, radius + 1):
+            for y in range(-radius, radius + 1):
+                world.get_room((x, y))
+        return (2 * radius + 1) ** 2
+    return setup, run
+
+def bench_generate_room():
+    """GameWorld._generate_room on its own, without the chunk table."""
+    def setup():
+        world = GameWorld(seed=1)
+        return world, random.Random(1)
+
+    def run(state):
+        world, rng = state
+        types = ["forest", "cave", "dungeon", "treasury", "armory"]
+        for i in range(20000):
+            world._generate_room(types[i % len(types)], 1 + i % 5, rng)
+        return 20000
+    return setup, run
+
+def bench_dispatch():
+    """Non-interactive commands through Game.handle and the command table."""
+    def setup():
+        game = make_game()
+        # Clear the rooms next to the village so every move succeeds
+        game.world.get_room((0, 1)).monsters = ()
+        game.world.get_room((1, 0)).monsters = ()
+        return game
+
+    def run(game):
+        for i in range(20000):
+            game.handle(SCRIPT[i % len(SCRIPT)])
+        return 20000
+    return setup, run
+
+def bench_fight():
+    """Scripted enhanced_fight rounds: one attack per round against a stream of lone trolls."""
+    def setup():
+        game = make_game()
+        game.player.location = (3, 3)
+        room = game.world.get_room((3, 3))
+        room.monsters = ()
+        game.player.health = game.player.max_health = 10 ** 9
+        return game, room
+
+    def run(state):
+        game, room = state
+        troll = game.world.monsters_db["troll"]
+        rounds = 0
+        while rounds < 20000:
+            room.add_monster(MonsterInstance(troll))
+            game.handle("f")
+            while game.pending and rounds < 20000:
+                game.handle("a")
+                rounds += 1
+        return rounds
+    return setup, run
+
+def bench_encounter():
+    """Rounds of 48-monster encounters, where every monster strikes each round."""
+    def setup():
+        game = make_game()
+        game.player.location = (3, 3)
+        room = game.world.get_room((3, 3))
+        room.monsters = ()
+        game.player.health = game.player.max_health = 10 ** 9
+        return game, room
+
+    def run(state):
+        game, room = state
+        monsters = [game.world.monsters_db[key] for key in ("goblin", "orc", "skeleton", "wolf", "spider", "bandit")]
+        rounds = 0
+        while rounds < 20000:
+            for i in range(48):
+                room.add_monster(MonsterInstance(monsters[i % len(monsters)]))
+            game.handle("f")
+            while game.pending and rounds < 20000:
+                game.handle("a")
+                rounds += 1
+        return rounds
+    return setup, run
+
+def bench_world_tick(rooms):
+    """World ticks with `rooms` rooms' timers pending, a hundred of them awake near the player."""
+    def setup():
+        world = GameWorld(seed=1)
+        # Respawns far in the future, as after a long career of cleared rooms
+        for i in range(rooms):
+            world.timers.schedule("respawn", (i % 1000 + 100, i // 1000 + 100), 10 ** 6)
+        for x in range(-1, 11):
+            for y in range(-1, 11):
+                world.get_room((x, y))
+        for x in range(10):
+            for y in range(10):
+                world.wake((x, y))
+        return world
+
+    def run(world):
+        for _ in range(2000):
+            world.advance(1)
+            # Keep the neighbourhood roaming, as a player walking about would
+            if world.timers.now % 10 == 0:
+                world.wake((5, 5))
+        return 2000
+    return setup, run
+
+def bench_craft():
+    """cmd_craft against an inventory holding hundreds of thousands of items."""
+    def setup():
+        game = make_game()
+        items_db = game.world.items_db
+        recipes = game.crafting_system.recipes
+        for recipe in recipes.values():
+            for material, count in recipe["materials"].items():
+                game.player.inventory.append(items_db[material], count * 100000)
+        for item in items_db.values():
+            game.player.inventory.append(item, 1000)
+        return game, list(recipes)
+
+    def run(state):
+        game, recipes = state
+        for i in range(20000):
+            game.cmd_craft(recipes[i % len(recipes)])
+        game.drain_events()
+        return 20000
+    return setup, run
+
+def bench_autoplay():
+    """AutoPlayer decisions over a seeded career, starting with cold policy tables."""
+    def setup():
+        autoplay._policy_tables.clear()
+        return autoplay.AutoPlayer(make_game())
+
+    def run(agent):
+        agent.run(20000)
+        if agent.game.game_over:
+            raise RuntimeError("the computer player died")
+        return agent.decisions
+    return setup, run
+
+def bench_save_load(rooms):
+    """cmd_save followed by cmd_load with `rooms` changed rooms in the world."""
+    def setup():
+        directory = tempfile.mkdtemp(prefix="dq-bench-")
+        game = make_game()
+        game.save_path = os.path.join(directory, "bench")
+        for i in range(rooms):
+            location = (i % 200 - 100, i // 200 + 1)
+            game.world.get_room(location).monsters = ()
+            game.world.mark_dirty(location)
+        return game, directory
+
+    def run(state):
+        game, directory = state
+        game.cmd_save()
+        game.cmd_load()
+        game.journal.close()
+        game.journal = None
+        game.drain_events()
+        shutil.rmtree(directory, ignore_errors=True)
+        return 1
+    return setup, run
+
+BENCHMARKS = {
+    "world_generation_r10": bench_world_generation(10),
+    "world_generation_r50": bench_world_generation(50),
+    "world_generation_r150": bench_world_generation(150),
+    "generate_room": bench_generate_room(),
+    "dispatch": bench_dispatch(),
+    "fight": bench_fight(),
+    "encounter": bench_encounter(),
+    "world_tick_1k": bench_world_tick(1000),
+    "world_tick_1m": bench_world_tick(1000000),
+    "craft": bench_craft(),
+    "autoplay": bench_autoplay(),
+    "save_load_100": bench_save_load(100),
+    "save_load_10000": bench_save_load(10000),
+}
+
+def run_benchmark(name, repeat):
+    setup, run = BENCHMARKS[name]
+    times = []
+    for _ in range(repeat):
+        random.seed(1)
+        state = setup()
+        start = time.perf_counter()
+        ops = run(state)
+        times.append(time.perf_counter() - start)
+    seconds = min(times)
+    return {"ops": ops, "seconds": seconds, "ops_per_sec": ops / seconds}
+
+def compare(results, baseline, threshold):
+    """Print the change against `baseline`; return the names that got slower than `threshold`."""
+    regressions = []
+    print(f"{'benchmark':<24} {'baseline':>12} {'current':>12} {'change':>8}", file=sys.stderr)
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<24} {'-':>12} {result['ops_per_sec']:12,.0f} {'new':>8}", file=sys.stderr)
+            continue
+        change = result["ops_per_sec"] / before["ops_per_sec"] - 1
+        flag = ""
+        if change < -threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<24} {before['ops_per_sec']:12,.0f} {result['ops_per_sec']:12,.0f} "
+              f"{change:+8.1%}{flag}", file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", help="comma-separated benchmark names (substrings match)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="one repetition per benchmark")
+    parser.add_argument("--output", help="write results here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown (fraction of ops/s) that counts as a regression")
+    args = parser.parse_args()
+
+    names = list(BENCHMARKS)
+    if args.only:
+        wanted = args.only.split(",")
+        names = [name for name in names if any(w in name for w in wanted)]
+    repeat = 1 if args.quick else args.repeat
+
+    results = {}
+    for name in names:
+        results[name] = run_benchmark(name, repeat)
+        print(f"  {name}: {results[name]['ops_per_sec']:,.0f} ops/s", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"FAIL: slower than baseline: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
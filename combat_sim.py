@@ -0,0 +1,148 @@
+"""Batch Monte Carlo combat simulator for balance tuning.
+
+Runs many independent fights at once with NumPy arrays using the same rules
+as the in-game fight loop: damage rolls, critical hits, the weather combat
+modifier, defend halving and the run-escape formula.
+
+    python combat_sim.py --fights 1000000 --weather rain
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from main import (
+    CRIT_CHANCE, DEFEND_FACTOR, MONSTER_DAMAGE_SPREAD, PLAYER_DAMAGE_SPREAD,
+    GameWorld, Monster, Player, WeatherSystem, escape_chance,
+)
+
+@dataclass
+class SimulationResult:
+    monster: str
+    fights: int
+    wins: int
+    losses: int
+    fled: int
+    timeouts: int
+    rounds_histogram: np.ndarray  # rounds_histogram[r] = wins that took r rounds
+    hp_lost_mean: float
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.fights
+
+    @property
+    def mean_rounds(self) -> float:
+        if not self.wins:
+            return 0.0
+        rounds = np.arange(len(self.rounds_histogram))
+        return float((rounds * self.rounds_histogram).sum() / self.wins)
+
+    def rounds_percentile(self, q: float) -> int:
+        if not self.wins:
+            return 0
+        cumulative = np.cumsum(self.rounds_histogram)
+        return int(np.searchsorted(cumulative, q / 100 * self.wins))
+
+def simulate_fights(player: Player, monster: Monster, fights: int = 1_000_000,
+                    weather_modifier: float = 1.0, flee_below: int = 0,
+                    defend_below: int = 0, max_rounds: int = 500,
+                    seed: Optional[int] = None) -> SimulationResult:
+    """Simulate `fights` independent battles between `player` and `monster`.
+
+    The player attacks every round, except that it defends while its health
+    is at or below `defend_below` and tries to run at or below `flee_below`.
+    """
+    rng = np.random.default_rng(seed)
+    attack = player.get_total_attack()
+    # Player.take_damage only subtracts base defense
+    defense = player.defense
+    escape = escape_chance(monster.attack)
+
+    player_hp = np.full(fights, player.health, dtype=np.int32)
+    monster_hp = np.full(fights, monster.health, dtype=np.int32)
+    outcome = np.zeros(fights, dtype=np.int8)  # 0 ongoing, 1 win, 2 loss, 3 fled
+    win_rounds = np.zeros(fights, dtype=np.int32)
+
+    active = np.arange(fights)
+    combat_round = 1
+    while active.size and combat_round <= max_rounds:
+        n = active.size
+        hp = player_hp[active]
+        fleeing = hp <= flee_below
+        defending = ~fleeing & (hp <= defend_below)
+        attacking = ~fleeing & ~defending
+
+        # Player attacks
+        base = rng.integers(attack - PLAYER_DAMAGE_SPREAD, attack + PLAYER_DAMAGE_SPREAD + 1, size=n)
+        damage = np.maximum(1, np.trunc(base * weather_modifier).astype(np.int32) - monster.defense)
+        damage[rng.random(n) < CRIT_CHANCE] *= 2
+        m_hp = monster_hp[active] - np.where(attacking, damage, 0)
+        monster_hp[active] = m_hp
+
+        won = m_hp <= 0
+        escaped = fleeing & (rng.random(n) < escape)
+
+        # Monster's turn
+        strikes = ~won & ~escaped
+        m_damage = rng.integers(monster.attack - MONSTER_DAMAGE_SPREAD,
+                                monster.attack + MONSTER_DAMAGE_SPREAD + 1, size=n)
+        m_damage = np.where(defending, np.trunc(m_damage * DEFEND_FACTOR).astype(np.int64), m_damage)
+        hp = hp - np.where(strikes, np.maximum(1, m_damage - defense), 0)
+        player_hp[active] = hp
+
+        lost = strikes & (hp <= 0)
+        outcome[active[won]] = 1
+        win_rounds[active[won]] = combat_round
+        outcome[active[lost]] = 2
+        outcome[active[escaped]] = 3
+
+        active = active[~(won | lost | escaped)]
+        combat_round += 1
+
+    wins = outcome == 1
+    hp_lost = player.health - np.maximum(player_hp, 0)
+    return SimulationResult(
+        monster=monster.name,
+        fights=fights,
+        wins=int(wins.sum()),
+        losses=int((outcome == 2).sum()),
+        fled=int((outcome == 3).sum()),
+        timeouts=int((outcome == 0).sum()),
+        rounds_histogram=np.bincount(win_rounds[wins], minlength=1),
+        hp_lost_mean=float(hp_lost.mean()),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo combat simulator for Dragon's Quest")
+    parser.add_argument("--fights", type=int, default=1_000_000)
+    parser.add_argument("--weather", default="clear", choices=sorted(WeatherSystem().weather_effects))
+    parser.add_argument("--level", type=int, default=1, help="approximate player level (average stat gains)")
+    parser.add_argument("--flee-below", type=int, default=0)
+    parser.add_argument("--defend-below", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    player = Player("Simulated")
+    # Average gains per level from Player.level_up
+    player.max_health += (args.level - 1) * 15
+    player.health = player.max_health
+    player.attack += int((args.level - 1) * 3.5)
+    player.defense += (args.level - 1) * 2
+    modifier = WeatherSystem().weather_effects[args.weather]["combat_modifier"]
+
+    print(f"{'Monster':<14} {'Win %':>7} {'Lose %':>7} {'Fled %':>7} {'Rounds':>7} {'p50':>4} {'p99':>4} {'HP lost':>8} {'Time':>7}")
+    for monster in GameWorld().monsters_db.values():
+        start = time.perf_counter()
+        result = simulate_fights(player, monster, args.fights, modifier,
+                                 args.flee_below, args.defend_below, seed=args.seed)
+        elapsed = time.perf_counter() - start
+        print(f"{result.monster:<14} {result.win_rate * 100:7.2f} "
+              f"{result.losses / result.fights * 100:7.2f} {result.fled / result.fights * 100:7.2f} "
+              f"{result.mean_rounds:7.2f} {result.rounds_percentile(50):4d} {result.rounds_percentile(99):4d} "
+              f"{result.hp_lost_mean:8.2f} {elapsed:6.2f}s")
+
+if __name__ == "__main__":
+    main()
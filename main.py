@@ -1,10 +1,57 @@
+import argparse
+import heapq
+import inspect
+import os
 import random
+import shelve
+import shutil
+import struct
+import sys
+import tempfile
+import threading
 import time
+import weakref
 import json
-from dataclasses import dataclass
+import math
+import tracemalloc
+from collections import Counter, OrderedDict, deque
+from itertools import accumulate, product, repeat
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 from enum import Enum
 
+# Combat rules shared by the fight loop and the combat simulator
+PLAYER_DAMAGE_SPREAD = 3
+MONSTER_DAMAGE_SPREAD = 2
+CRIT_CHANCE = 0.1
+DEFEND_FACTOR = 0.5
+BASE_ESCAPE_CHANCE = 0.7
+
+def escape_chance(monster_attack: int) -> float:
+    # Harder to escape from strong monsters
+    return BASE_ESCAPE_CHANCE - (monster_attack / 100)
+
+# Number of striped locks guarding room contents in a shared world
+ROOM_LOCK_STRIPES = 256
+
+# (dx, dy) for each compass direction, in the order exits are listed
+DIRECTION_OFFSETS = {"north": (0, 1), "south": (0, -1), "east": (1, 0), "west": (-1, 0)}
+
+# How many recent room changes the world remembers for incremental map redraws
+ROOM_CHANGE_LOG = 4096
+
+# Route planning counts a room known to hold monsters as this many steps,
+# since travel has to stop there
+TRAVEL_MONSTER_COST = 10
+
+# World simulation, in turns (see GameWorld.advance)
+RESPAWN_DELAY = 50      # a cleared room fills up again this long after its last kill
+ROAM_INTERVAL = 5       # awake monsters consider moving to a neighbouring room this often
+ROAM_CHANCE = 0.5
+AWAKE_TURNS = 30        # monsters near a player stay awake (roaming) this long
+ROOM_CROWD_LIMIT = 6    # monsters don't roam into rooms holding this many already
+
 class ItemType(Enum):
     WEAPON = "weapon"
     ARMOR = "armor"
@@ -17,13 +64,124 @@ class Direction(Enum):
     EAST = "east"
     WEST = "west"
 
-@dataclass
+@dataclass(frozen=True)
 class Item:
+    """An item template. Items carry no per-instance state, so every copy of
+    an item in the world or an inventory is a reference to the same template
+    in GameWorld.items_db, identified by its key."""
     name: str
     type: ItemType
     value: int
     description: str
     effect: int = 0
+    key: str = ""
+
+@lru_cache(maxsize=None)
+def _name_substrings(name: str) -> frozenset:
+    name = name.lower()
+    return frozenset(name[i:j] for i in range(len(name)) for j in range(i + 1, len(name) + 1))
+
+class Inventory:
+    """A multiset of item templates.
+    
+    Items are stored as template -> count, so adding, removing and counting
+    are O(1) however many copies are held. Name lookups go through an index
+    of every substring of the held templates' names, built on the first
+    lookup and kept up to date as templates come and go. Iteration yields
+    each copy, grouped by template in the order templates were first added.
+    
+    `version` goes up on every change, so results computed from the
+    contents can be cached against it.
+    """
+    __slots__ = ("_counts", "_size", "_index", "version")
+    
+    def __init__(self, items=()):
+        self._counts: Dict[Item, int] = {}
+        self._size = 0
+        self._index = None  # substring -> {template: None}, in inventory order
+        self.version = 0
+        for item in items:
+            self.append(item)
+    
+    def __len__(self):
+        return self._size
+    
+    def __bool__(self):
+        return self._size > 0
+    
+    def __iter__(self):
+        for item, count in self._counts.items():
+            yield from repeat(item, count)
+    
+    def __contains__(self, item):
+        return item in self._counts
+    
+    def count(self, item: Item) -> int:
+        return self._counts.get(item, 0)
+    
+    def distinct(self):
+        """(template, count) pairs in inventory order."""
+        return self._counts.items()
+    
+    def append(self, item: Item, count: int = 1):
+        held = self._counts.get(item, 0)
+        self._counts[item] = held + count
+        self._size += count
+        self.version += 1
+        if not held and self._index is not None:
+            for substring in _name_substrings(item.name):
+                self._index.setdefault(substring, {})[item] = None
+    
+    def remove(self, item: Item, count: int = 1):
+        held = self._counts.get(item, 0)
+        if held < count:
+            raise ValueError(f"{item.name} x{count} not in inventory")
+        self._size -= count
+        self.version += 1
+        if held > count:
+            self._counts[item] = held - count
+            return
+        del self._counts[item]
+        if self._index is not None:
+            for substring in _name_substrings(item.name):
+                bucket = self._index[substring]
+                del bucket[item]
+                if not bucket:
+                    del self._index[substring]
+    
+    def find(self, text: str) -> Optional[Item]:
+        """The first held template whose name contains `text` (case-insensitive)."""
+        if self._index is None:
+            self._index = {}
+            for item in self._counts:
+                for substring in _name_substrings(item.name):
+                    self._index.setdefault(substring, {})[item] = None
+        bucket = self._index.get(text.lower())
+        return next(iter(bucket)) if bucket else None
+
+@dataclass
+class GameEvent:
+    kind: str  # "message", "prompt", "pause" or "game_over"
+    text: str
+    duration: float = 0.0  # seconds, for "pause" events
+
+class EventBus:
+    """Publish/subscribe for things that happen in play.
+    
+    Events are (event type, target, count): ("kill", "goblin", 1),
+    ("pickup", "ruby", 1), ("craft", "steel_sword", 1), ("move", "ruins", 1).
+    Targets are monster and item keys, or room types for moves; a move is
+    only published the first time the player enters a room.
+    """
+    def __init__(self):
+        self._handlers = {}
+    
+    def subscribe(self, event_type: str, handler):
+        self._handlers.setdefault(event_type, []).append(handler)
+    
+    def publish(self, event_type: str, target: str, count: int = 1):
+        for handler in self._handlers.get(event_type, ()):
+            handler(event_type, target, count)
 
 @dataclass
 class Monster:
@@ -35,6 +193,130 @@ class Monster:
     exp_value: int
     gold_drop: Tuple[int, int]
     description: str
+    key: str = ""  # this monster's key in GameWorld.monsters_db
+    regeneration: int = 0  # health regained per turn while hurt
+
+class MonsterInstance:
+    """A monster placed in the world: a shared Monster template plus its own health."""
+    __slots__ = ("template", "health")
+    
+    def __init__(self, template: Monster, health: Optional[int] = None):
+        self.template = template
+        self.health = template.health if health is None else health
+    
+    name = property(lambda self: self.template.name)
+    max_health = property(lambda self: self.template.max_health)
+    attack = property(lambda self: self.template.attack)
+    defense = property(lambda self: self.template.defense)
+    exp_value = property(lambda self: self.template.exp_value)
+    gold_drop = property(lambda self: self.template.gold_drop)
+    description = property(lambda self: self.template.description)
+    key = property(lambda self: self.template.key)
+    regeneration = property(lambda self: self.template.regeneration)
+
+class Room:
+    """A single location on the map.
+    
+    Worlds hold a very large number of rooms, so rooms use __slots__, share
+    their type and description strings, and keep empty monster and item
+    lists as a shared empty tuple until something is added.
+    """
+    __slots__ = ("type", "description", "monsters", "items", "special")
+    
+    def __init__(self, type: str, description: str, special: Optional[str] = None):
+        self.type = type
+        self.description = description
+        self.monsters = ()
+        self.items = ()
+        self.special = special
+    
+    def add_monster(self, monster: MonsterInstance):
+        if not self.monsters:
+            self.monsters = []
+        self.monsters.append(monster)
+    
+    def remove_monster(self, monster: MonsterInstance):
+        self.monsters.remove(monster)
+        if not self.monsters:
+            self.monsters = ()
+    
+    def add_item(self, item: Item):
+        if not self.items:
+            self.items = Inventory()
+        self.items.append(item)
+    
+    def remove_item(self, item: Item):
+        self.items.remove(item)
+        if not self.items:
+            self.items = ()
+
+class ExploredMap:
+    """The set of rooms a player has been in, one bit per room.
+    
+    Bits are kept in 64x64 tiles of 512 bytes, created as the player first
+    reaches them, so memory follows the explored area and not the size of
+    the map. Newly explored rooms are also queued in `recent` until the map
+    is next drawn; after RECENT_LIMIT of them it becomes None, meaning
+    "too many to track, redraw everything". The keys of tiles that gained
+    rooms are kept in `changed` until the save journal takes them.
+    """
+    TILE_BITS = 6
+    RECENT_LIMIT = 4096
+    __slots__ = ("tiles", "count", "recent", "changed")
+    
+    def __init__(self):
+        self.tiles = {}
+        self.count = 0
+        self.recent = []
+        self.changed = set()
+    
+    @staticmethod
+    def _slot(location: Tuple[int, int]):
+        # (tile key, byte index, bit mask); 6 == TILE_BITS, spelled out
+        # because this runs on every move
+        x, y = location
+        bit = ((y & 63) << 6) | (x & 63)
+        return (x >> 6, y >> 6), bit >> 3, 1 << (bit & 7)
+    
+    def add(self, location: Tuple[int, int]):
+        tile_key, index, bit = self._slot(location)
+        tile = self.tiles.get(tile_key)
+        if tile is None:
+            tile = self.tiles[tile_key] = bytearray(1 << (2 * self.TILE_BITS - 3))
+        elif tile[index] & bit:
+            return
+        tile[index] |= bit
+        self.count += 1
+        self.changed.add(tile_key)
+        if self.recent is not None:
+            self.recent.append(location)
+            if len(self.recent) > self.RECENT_LIMIT:
+                self.recent = None
+    
+    def take_recent(self) -> Optional[List[Tuple[int, int]]]:
+        recent, self.recent = self.recent, []
+        return recent
+    
+    def take_changed(self) -> set:
+        changed, self.changed = self.changed, set()
+        return changed
+    
+    def set_tile(self, tile_key: Tuple[int, int], bits: bytes):
+        """Replace one tile's bits, as read back from a save."""
+        old = self.tiles.get(tile_key)
+        if old is not None:
+            self.count -= bin(int.from_bytes(old, "little")).count("1")
+        self.tiles[tile_key] = bytearray(bits)
+        self.count += bin(int.from_bytes(bits, "little")).count("1")
+        self.recent = None
+    
+    def __contains__(self, location: Tuple[int, int]) -> bool:
+        tile_key, index, bit = self._slot(location)
+        tile = self.tiles.get(tile_key)
+        return tile is not None and bool(tile[index] & bit)
+    
+    def __len__(self) -> int:
+        return self.count
 
 class Player:
     def __init__(self, name: str):
@@ -47,31 +329,42 @@ class Player:
         self.exp = 0
         self.exp_to_next = 100
         self.gold = 50
-        self.inventory = []
+        self.inventory = Inventory()
         self.equipped_weapon = None
         self.equipped_armor = None
+        self.explored = ExploredMap()
         self.location = (0, 0)
+    
+    @property
+    def location(self) -> Tuple[int, int]:
+        return self._location
+    
+    @location.setter
+    def location(self, location: Tuple[int, int]):
+        # Wherever the player goes counts as explored
+        self._location = location
+        self.explored.add(location)
         
-    def level_up(self):
+    def level_up(self, output=print, rng=random):
         if self.exp >= self.exp_to_next:
             self.level += 1
             self.exp -= self.exp_to_next
             self.exp_to_next = int(self.exp_to_next * 1.5)
             
             # Stat increases
-            health_increase = random.randint(10, 20)
-            attack_increase = random.randint(2, 5)
-            defense_increase = random.randint(1, 3)
+            health_increase = rng.randint(10, 20)
+            attack_increase = rng.randint(2, 5)
+            defense_increase = rng.randint(1, 3)
             
             self.max_health += health_increase
             self.health = self.max_health  # Full heal on level up
             self.attack += attack_increase
             self.defense += defense_increase
             
-            print(f"\n🎉 LEVEL UP! You are now level {self.level}!")
-            print(f"   Health: +{health_increase} (now {self.max_health})")
-            print(f"   Attack: +{attack_increase} (now {self.attack})")
-            print(f"   Defense: +{defense_increase} (now {self.defense})")
+            output(f"\n🎉 LEVEL UP! You are now level {self.level}!")
+            output(f"   Health: +{health_increase} (now {self.max_health})")
+            output(f"   Attack: +{attack_increase} (now {self.attack})")
+            output(f"   Defense: +{defense_increase} (now {self.defense})")
             return True
         return False
     
@@ -97,15 +390,129 @@ class Player:
             base_defense += self.equipped_armor.effect
         return base_defense
 
-class GameWorld:
+ROOM_TYPES = [
+    "forest", "cave", "ruins", "mountain", "swamp", "desert", 
+    "village", "dungeon", "tower", "library", "armory", "treasury"
+]
+
+ROOM_DESCRIPTIONS = {
+    "forest": "A dense woodland with towering trees and dappled sunlight.",
+    "cave": "A dark cavern with echoing drips and mysterious shadows.",
+    "ruins": "Ancient stone structures covered in moss and ivy.",
+    "mountain": "Rocky peaks with thin air and treacherous paths.",
+    "swamp": "Murky wetlands with twisted trees and strange sounds.",
+    "desert": "Endless sand dunes under a scorching sun.",
+    "dungeon": "A foreboding underground chamber filled with danger.",
+    "tower": "A tall spire reaching toward the clouds.",
+    "library": "A repository of ancient knowledge and dusty tomes.",
+    "armory": "A weapons cache left behind by long-dead warriors.",
+    "treasury": "A vault that once held great riches.",
+}
+
+VILLAGE_DESCRIPTION = "A peaceful village with friendly merchants and warm hearths."
+
+class WorldTimers:
+    """Scheduled world events, in a heap ordered by the turn they fall due.
+    
+    Only rooms with something scheduled are in the heap, and advance() pops
+    just the events that are due, so a tick costs O(k log n) for k due
+    events no matter how many rooms the world has. An (event, room) pair is
+    scheduled at most once; scheduling it sooner replaces the later time,
+    and the stale heap entry is skipped when it surfaces.
+    """
     def __init__(self):
-        self.rooms = {}
+        self.now = 0
+        self._heap = []
+        self._due = {}  # (event, location) -> turn it is due
+    
+    def __len__(self):
+        return len(self._due)
+    
+    def schedule(self, event: str, location: Tuple[int, int], delay: int):
+        key = (event, location)
+        due = self.now + delay
+        scheduled = self._due.get(key)
+        if scheduled is not None and scheduled <= due:
+            return
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, event, location))
+    
+    def scheduled(self, event: str, location: Tuple[int, int]) -> bool:
+        return (event, location) in self._due
+    
+    def advance(self, turns: int):
+        """Move the clock on `turns` turns and yield (due turn, event, location) for everything now due."""
+        self.now += turns
+        heap, due = self._heap, self._due
+        while heap and heap[0][0] <= self.now:
+            entry = heapq.heappop(heap)
+            key = (entry[1], entry[2])
+            if due.get(key) == entry[0]:
+                del due[key]
+                yield entry
+
+class GameWorld:
+    """The map, generated lazily as rooms are first visited.
+    
+    Every room is built from its own random stream seeded by (seed, x, y), so
+    its contents do not depend on the order rooms are generated in, and two
+    worlds with the same seed are identical. That lets unmodified rooms be
+    thrown away and rebuilt on demand.
+    
+    Rooms are grouped into chunk_size x chunk_size chunks and only
+    `max_chunks` chunks are kept in memory. The least recently used chunk is
+    dropped when that limit is exceeded; rooms marked dirty (a monster fought,
+    an item taken) are written to a spill file first and loaded back from it
+    when revisited.
+    
+    `radius` bounds the world to the square of rooms with |x|, |y| <= radius;
+    None makes it unbounded.
+    
+    The world also lives on its own: advance() runs the `timers` that
+    respawn cleared rooms, move awake monsters between rooms and heal
+    regenerating monsters. Sessions advance it by the turns they play.
+    
+    With a `store` (roomstore.MappedRoomStore) rooms are read from and
+    written back to a memory-mapped file instead: generated rooms are saved
+    into it, evicted dirty rooms go back to it, and only rooms that do not
+    fit a store record use the spill file.
+    """
+    
+    def __init__(self, radius: Optional[int] = None, chunk_size: int = 16,
+                 max_chunks: int = 64, seed: Optional[int] = None, spill_path: Optional[str] = None,
+                 store=None):
+        self.radius = radius
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        # Optional backing store for rooms (see roomstore.MappedRoomStore); it
+        # decides the world's seed and bounds
+        self.store = store
+        if store is not None:
+            self.seed, self.radius = store.seed, store.radius
+        self.chunks = OrderedDict()  # (cx, cy) -> {(x, y): room}, least recently used first
+        self.dirty_rooms = set()
+        # Recent (sequence number, location) room changes, for redrawing maps
+        # and journaling saves; each reader keeps its own place in the log
+        self.room_changes = deque(maxlen=ROOM_CHANGE_LOG)
+        self.room_change_count = 0
+        self.pinned_chunks = Counter()
+        self.busy_rooms = Counter()  # rooms a session is mid-fight (or mid-prompt) in
+        self._room_rng = random.Random()
+        self._chunks_lock = threading.RLock()
+        self._room_locks = [threading.Lock() for _ in range(ROOM_LOCK_STRIPES)]
+        self.spill_path = spill_path
+        self._spill = None
         self.items_db = self._create_items_db()
         self.monsters_db = self._create_monsters_db()
-        self._generate_world()
+        self.timers = WorldTimers()
+        self.awake = {}  # location -> turn its monsters stop roaming
+        self._tick_rng = random.Random()
+        if store is not None:
+            store.bind(self)
     
     def _create_items_db(self):
-        return {
+        items = {
             "rusty_sword": Item("Rusty Sword", ItemType.WEAPON, 25, "An old but serviceable blade.", 5),
             "iron_sword": Item("Iron Sword", ItemType.WEAPON, 100, "A well-crafted iron weapon.", 12),
             "steel_sword": Item("Steel Sword", ItemType.WEAPON, 250, "A sharp steel blade that gleams.", 20),
@@ -124,69 +531,44 @@ class GameWorld:
             "emerald": Item("Emerald", ItemType.TREASURE, 300, "A valuable green stone.", 0),
             "diamond": Item("Diamond", ItemType.TREASURE, 500, "A brilliant crystal of immense value.", 0),
         }
+        return {key: replace(item, key=key) for key, item in items.items()}
     
     def _create_monsters_db(self):
-        return {
+        monsters = {
             "goblin": Monster("Goblin", 25, 25, 8, 2, 15, (5, 12), "A small, green-skinned creature with sharp teeth."),
             "orc": Monster("Orc", 40, 40, 12, 4, 25, (8, 20), "A brutish humanoid with tusks and crude weapons."),
             "skeleton": Monster("Skeleton", 35, 35, 10, 6, 20, (3, 15), "Animated bones held together by dark magic."),
-            "troll": Monster("Troll", 80, 80, 18, 8, 50, (20, 40), "A massive creature with regenerative abilities."),
+            "troll": Monster("Troll", 80, 80, 18, 8, 50, (20, 40), "A massive creature with regenerative abilities.",
+                             regeneration=4),
             "dragon": Monster("Dragon", 200, 200, 35, 15, 200, (100, 200), "An ancient, fire-breathing beast of legend."),
             "wolf": Monster("Wolf", 30, 30, 14, 3, 18, (6, 15), "A fierce predator with sharp fangs."),
             "spider": Monster("Giant Spider", 20, 20, 6, 1, 12, (3, 8), "An oversized arachnid with venomous fangs."),
             "bandit": Monster("Bandit", 45, 45, 16, 5, 30, (15, 35), "A highway robber armed and dangerous."),
         }
+        return {key: replace(monster, key=key) for key, monster in monsters.items()}
     
-    def _generate_world(self):
-        # Create a 5x5 grid world with different room types
-        room_types = [
-            "forest", "cave", "ruins", "mountain", "swamp", "desert", 
-            "village", "dungeon", "tower", "library", "armory", "treasury"
-        ]
-        
-        for x in range(-2, 3):
-            for y in range(-2, 3):
-                if x == 0 and y == 0:
-                    # Starting location - safe village
-                    room = {
-                        "type": "village",
-                        "description": "A peaceful village with friendly merchants and warm hearths.",
-                        "monsters": [],
-                        "items": [],
-                        "special": "shop"
-                    }
-                else:
-                    room_type = random.choice(room_types)
-                    room = self._generate_room(room_type, abs(x) + abs(y))
-                
-                self.rooms[(x, y)] = room
-    
-    def _generate_room(self, room_type: str, difficulty: int):
-        descriptions = {
-            "forest": "A dense woodland with towering trees and dappled sunlight.",
-            "cave": "A dark cavern with echoing drips and mysterious shadows.",
-            "ruins": "Ancient stone structures covered in moss and ivy.",
-            "mountain": "Rocky peaks with thin air and treacherous paths.",
-            "swamp": "Murky wetlands with twisted trees and strange sounds.",
-            "desert": "Endless sand dunes under a scorching sun.",
-            "dungeon": "A foreboding underground chamber filled with danger.",
-            "tower": "A tall spire reaching toward the clouds.",
-            "library": "A repository of ancient knowledge and dusty tomes.",
-            "armory": "A weapons cache left behind by long-dead warriors.",
-            "treasury": "A vault that once held great riches.",
-        }
-        
-        room = {
-            "type": room_type,
-            "description": descriptions.get(room_type, "A mysterious location."),
-            "monsters": [],
-            "items": [],
-            "special": None
-        }
+    def room_seed(self, location: Tuple[int, int]) -> int:
+        """The seed a room is generated from; it depends only on the world seed and the coordinates."""
+        x, y = location
+        return (self.seed << 64) | ((x & 0xFFFFFFFF) << 32) | (y & 0xFFFFFFFF)
+    
+    def _generate_room_at(self, location: Tuple[int, int]):
+        x, y = location
+        if x == 0 and y == 0:
+            # Starting location - safe village
+            return Room("village", VILLAGE_DESCRIPTION, "shop")
+        
+        rng = self._room_rng
+        rng.seed(self.room_seed(location))
+        room_type = rng.choice(ROOM_TYPES)
+        return self._generate_room(room_type, abs(x) + abs(y), rng)
+    
+    def _generate_room(self, room_type: str, difficulty: int, rng=random):
+        room = Room(room_type, ROOM_DESCRIPTIONS.get(room_type, "A mysterious location."))
         
         # Add monsters based on difficulty
-        if random.random() < 0.6:  # 60% chance of monsters
-            monster_count = random.randint(1, min(3, difficulty))
+        if rng.random() < 0.6:  # 60% chance of monsters
+            monster_count = rng.randint(1, min(3, difficulty))
             available_monsters = ["goblin", "orc", "skeleton", "wolf", "spider"]
             
             if difficulty >= 3:
@@ -195,151 +577,1134 @@ class GameWorld:
                 available_monsters.append("dragon")
             
             for _ in range(monster_count):
-                monster_key = random.choice(available_monsters)
-                monster = Monster(**self.monsters_db[monster_key].__dict__)
-                room["monsters"].append(monster)
+                monster_key = rng.choice(available_monsters)
+                room.add_monster(MonsterInstance(self.monsters_db[monster_key]))
         
         # Add items based on room type and difficulty
-        if random.random() < 0.4:  # 40% chance of items
+        if rng.random() < 0.4:  # 40% chance of items
             if room_type == "treasury":
                 # Treasury rooms have better loot
                 treasure_items = ["ruby", "emerald", "diamond", "steel_sword", "dragon_armor"]
-                item_key = random.choice(treasure_items)
+                item_key = rng.choice(treasure_items)
             elif room_type == "armory":
                 # Armory rooms have weapons and armor
                 weapon_items = ["iron_sword", "steel_sword", "chain_mail", "plate_armor"]
-                item_key = random.choice(weapon_items)
+                item_key = rng.choice(weapon_items)
             else:
                 # Regular loot distribution
                 all_items = list(self.items_db.keys())
-                item_key = random.choice(all_items)
+                item_key = rng.choice(all_items)
             
-            item = Item(**self.items_db[item_key].__dict__)
-            room["items"].append(item)
+            room.add_item(self.items_db[item_key])
         
         return room
     
+    # Exits for every combination of (north, south, east, west) being open
+    EXITS = {open_: tuple(direction for direction, is_open in zip(DIRECTION_OFFSETS, open_) if is_open)
+             for open_ in product((False, True), repeat=4)}
+    
+    def exits(self, location: Tuple[int, int]) -> Tuple[str, ...]:
+        """Directions that lead to another room. The map is a full grid, so
+        this only depends on which edges of a bounded world `location` is on."""
+        radius = self.radius
+        if radius is None:
+            return self.EXITS[True, True, True, True]
+        x, y = location
+        return self.EXITS[y < radius, y > -radius, x < radius, x > -radius]
+    
+    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int],
+                  max_expansions: int = 2_000_000) -> Optional[List[str]]:
+        """Plan a route from `start` to `goal` as a list of directions.
+        
+        A* over the grid with Manhattan distance as the heuristic. Rooms in
+        memory that hold monsters cost TRAVEL_MONSTER_COST steps, so the
+        route goes around them when a short detour exists; rooms never
+        generated are assumed to be clear. Returns None if `goal` is off the
+        map or the search gives up after `max_expansions` rooms.
+        
+        Monsters in memory are confined to a small area, so as soon as the
+        search reaches a room whose rectangle to the goal misses that area
+        the rest of the route is a straight staircase. Long journeys cost
+        little more than the part of the trip near known monsters.
+        """
+        if not self.has_room(goal):
+            return None
+        with self._chunks_lock:
+            guarded = {location for location, room in self.loaded_rooms() if room.monsters}
+        guarded.discard(goal)
+        gx, gy = goal
+        if guarded:
+            min_x = min(x for x, _ in guarded)
+            max_x = max(x for x, _ in guarded)
+            min_y = min(y for _, y in guarded)
+            max_y = max(y for _, y in guarded)
+        
+        steps = [(direction, dx, dy) for direction, (dx, dy) in DIRECTION_OFFSETS.items()]
+        distance = abs(gx - start[0]) + abs(gy - start[1])
+        # Ties on f are broken towards the goal, which keeps the search to a
+        # narrow band around the straight route when nothing is in the way
+        frontier = [(distance, distance, 0, start)]
+        cost = {start: 0}
+        came_from = {start: None}
+        expansions = 0
+        while frontier:
+            _, _, location_cost, location = heapq.heappop(frontier)
+            if location_cost > cost[location]:
+                continue  # already reached more cheaply
+            x, y = location
+            if (location == goal or not guarded or max(x, gx) < min_x or min(x, gx) > max_x
+                    or max(y, gy) < min_y or min(y, gy) > max_y):
+                # Nothing known in the way from here on: walk straight there
+                route = []
+                while came_from[location] is not None:
+                    location, direction = came_from[location]
+                    route.append(direction)
+                route.reverse()
+                route += ["east" if gx > x else "west"] * abs(gx - x)
+                route += ["north" if gy > y else "south"] * abs(gy - y)
+                return route
+            expansions += 1
+            if expansions > max_expansions:
+                return None
+            
+            for direction, dx, dy in steps:
+                neighbor = (x + dx, y + dy)
+                if not self.has_room(neighbor):
+                    continue
+                new_cost = location_cost + (TRAVEL_MONSTER_COST if neighbor in guarded else 1)
+                if new_cost < cost.get(neighbor, new_cost + 1):
+                    cost[neighbor] = new_cost
+                    came_from[neighbor] = (location, direction)
+                    remaining = abs(gx - neighbor[0]) + abs(gy - neighbor[1])
+                    heapq.heappush(frontier, (new_cost + remaining, remaining, new_cost, neighbor))
+        return None
+    
+    def has_room(self, location: Tuple[int, int]) -> bool:
+        if self.radius is None:
+            return True
+        x, y = location
+        return abs(x) <= self.radius and abs(y) <= self.radius
+    
     def get_room(self, location: Tuple[int, int]):
-        return self.rooms.get(location)
+        if not self.has_room(location):
+            return None
+        chunk_key = (location[0] // self.chunk_size, location[1] // self.chunk_size)
+        with self._chunks_lock:
+            chunk = self.chunks.get(chunk_key)
+            if chunk is None:
+                chunk = self._load_chunk(chunk_key)
+            else:
+                self.chunks.move_to_end(chunk_key)
+            
+            room = chunk.get(location)
+            if room is None:
+                room = self.store.get(location) if self.store is not None else None
+                if room is None:
+                    room = self._generate_room_at(location)
+                    if self.store is not None:
+                        self.store.put(location, room)
+                chunk[location] = room
+            return room
+    
+    def room_lock(self, location: Tuple[int, int]):
+        """The lock serializing changes to the monsters and items of one room.
+        
+        Locks are striped by coordinate, so sessions in different rooms almost
+        never contend, without keeping a lock object per room.
+        """
+        return self._room_locks[hash(location) % ROOM_LOCK_STRIPES]
+    
+    def pin(self, location: Tuple[int, int]):
+        """Keep the chunk holding `location` in memory, and its monsters in
+        place, until unpin() is called."""
+        with self._chunks_lock:
+            self.pinned_chunks[(location[0] // self.chunk_size, location[1] // self.chunk_size)] += 1
+            self.busy_rooms[location] += 1
+    
+    def unpin(self, location: Tuple[int, int]):
+        chunk_key = (location[0] // self.chunk_size, location[1] // self.chunk_size)
+        with self._chunks_lock:
+            self.pinned_chunks[chunk_key] -= 1
+            if self.pinned_chunks[chunk_key] <= 0:
+                del self.pinned_chunks[chunk_key]
+            self.busy_rooms[location] -= 1
+            if self.busy_rooms[location] <= 0:
+                del self.busy_rooms[location]
+    
+    def mark_dirty(self, location: Tuple[int, int]):
+        """Record that the room at `location` changed and must survive eviction."""
+        self.dirty_rooms.add(location)
+        self.room_change_count += 1
+        self.room_changes.append((self.room_change_count, location))
+    
+    def changes_since(self, count: int) -> Optional[List[Tuple[int, int]]]:
+        """Locations marked dirty after change number `count`, or None if the
+        log no longer reaches back that far."""
+        if count == self.room_change_count:
+            return []
+        changes = list(self.room_changes)
+        if not changes or changes[0][0] > count + 1:
+            return None
+        return [location for _, location in changes[count + 1 - changes[0][0]:]]
+    
+    def modified_rooms(self) -> List[Tuple[Tuple[int, int], "Room"]]:
+        """Every room that differs from its generated state, in memory or spilled."""
+        with self._chunks_lock:
+            rooms = {location: room for location, room in self.loaded_rooms() if location in self.dirty_rooms}
+            if self._spill is not None:
+                for spill_key in self._spill:
+                    rooms.update(self._spill[spill_key])
+            if self.store is not None:
+                for location in self.store.modified:
+                    if location not in rooms:
+                        chunk = self.chunks.get((location[0] // self.chunk_size, location[1] // self.chunk_size))
+                        room = chunk.get(location) if chunk else None
+                        rooms[location] = room if room is not None else self.store.get(location)
+            return list(rooms.items())
+    
+    def loaded_rooms(self):
+        for chunk in self.chunks.values():
+            yield from chunk.items()
+    
+    def _load_chunk(self, chunk_key: Tuple[int, int]):
+        spill_key = f"{chunk_key[0]},{chunk_key[1]}"
+        if self._spill is not None and spill_key in self._spill:
+            chunk = self._spill.pop(spill_key)
+            self.dirty_rooms.update(chunk)
+        else:
+            chunk = {}
+        
+        self.chunks[chunk_key] = chunk
+        while len(self.chunks) > self.max_chunks and self._evict_chunk(keep=chunk_key):
+            pass
+        return chunk
+    
+    def _evict_chunk(self, keep: Tuple[int, int]) -> bool:
+        # Least recently used chunk that nobody has pinned
+        chunk_key = next((key for key in self.chunks if key != keep and key not in self.pinned_chunks), None)
+        if chunk_key is None:
+            return False
+        chunk = self.chunks.pop(chunk_key)
+        changed = {location: room for location, room in chunk.items() if location in self.dirty_rooms}
+        self.dirty_rooms.difference_update(changed)
+        if self.store is not None:
+            # Rooms that fit a store record go back to the store; the rest spill
+            changed = {location: room for location, room in changed.items()
+                       if not self.store.put(location, room, modified=True)}
+        if changed:
+            self._open_spill()[f"{chunk_key[0]},{chunk_key[1]}"] = changed
+        return True
+    
+    def wake(self, location: Tuple[int, int], explored: Optional["ExploredMap"] = None):
+        """Start the monsters in and around `location` roaming for AWAKE_TURNS.
+        
+        With `explored`, only neighbouring rooms in it wake; the rest stay
+        asleep until a player gets there, and need not be generated.
+        """
+        x, y = location
+        until = self.timers.now + AWAKE_TURNS
+        for direction in (None,) + self.exits(location):
+            if direction is not None:
+                dx, dy = DIRECTION_OFFSETS[direction]
+                location = (x + dx, y + dy)
+                if explored is not None and location not in explored:
+                    continue
+            if self.awake.get(location) != until and self.get_room(location).monsters:
+                self.awake[location] = until
+                self.timers.schedule("roam", location, ROAM_INTERVAL)
+    
+    def advance(self, turns: int) -> set:
+        """Run the world `turns` turns on; returns the rooms monsters moved or respawned into."""
+        arrivals = set()
+        end = self.timers.now + turns
+        rng = None
+        for due, event, location in self.timers.advance(turns):
+            if event == "respawn":
+                self._respawn(location, arrivals)
+            elif event == "roam":
+                if rng is None:
+                    # One stream per tick, seeded by world and turn, so replays see the same moves
+                    rng = self._tick_rng
+                    rng.seed((self.seed << 64) | end)
+                self._roam(location, due, rng, arrivals)
+            elif event == "regenerate":
+                self._regenerate(location)
+        return arrivals
+    
+    def _respawn(self, location: Tuple[int, int], arrivals: set):
+        room = self.get_room(location)
+        if room.monsters:
+            return
+        if location in self.busy_rooms:
+            self.timers.schedule("respawn", location, ROAM_INTERVAL)
+            return
+        with self._chunks_lock:
+            # The monsters the room was generated with come back
+            fresh = self._generate_room_at(location)
+        with self.room_lock(location):
+            for monster in fresh.monsters:
+                room.add_monster(monster)
+        if fresh.monsters:
+            self.mark_dirty(location)
+            arrivals.add(location)
+    
+    def _roam(self, location: Tuple[int, int], due: int, rng: random.Random, arrivals: set):
+        # Which monsters roam depends only on play (where players woke them
+        # and where they have moved since), never on which chunks are in
+        # memory, so replays and other sessions see the same world
+        room = self.get_room(location)
+        until = self.awake.get(location, 0)
+        if not room.monsters or until <= due:
+            self.awake.pop(location, None)
+            return
+        self.timers.schedule("roam", location, ROAM_INTERVAL)
+        if rng.random() >= ROAM_CHANCE or location in self.busy_rooms:
+            return
+        
+        dx, dy = DIRECTION_OFFSETS[rng.choice(self.exits(location))]
+        destination = (location[0] + dx, location[1] + dy)
+        target = self.get_room(destination)
+        if (target.type == "village" or len(target.monsters) >= ROOM_CROWD_LIMIT
+                or destination in self.busy_rooms):
+            return
+        
+        with self.room_lock(location):
+            if not room.monsters:
+                return
+            monster = room.monsters[rng.randrange(len(room.monsters))]
+            room.remove_monster(monster)
+        with self.room_lock(destination):
+            target.add_monster(monster)
+        self.mark_dirty(location)
+        self.mark_dirty(destination)
+        arrivals.add(destination)
+        # The monster keeps its room's waking time rather than extending it
+        if self.awake.get(destination, 0) < until:
+            self.awake[destination] = until
+        self.timers.schedule("roam", destination, ROAM_INTERVAL)
+        if monster.regeneration and monster.health < monster.max_health:
+            self.timers.schedule("regenerate", destination, 1)
+    
+    def _regenerate(self, location: Tuple[int, int]):
+        room = self.get_room(location)
+        healed = hurt = False
+        with self.room_lock(location):
+            for monster in room.monsters:
+                if monster.regeneration and monster.health < monster.max_health:
+                    monster.health = min(monster.max_health, monster.health + monster.regeneration)
+                    healed = True
+                    hurt = hurt or monster.health < monster.max_health
+        if healed:
+            self.mark_dirty(location)
+        if hurt:
+            self.timers.schedule("regenerate", location, 1)
+    
+    def reset(self, seed: int, radius: Optional[int]):
+        """Put every room back the way it was generated, as the world of `seed` and `radius`.
+        
+        The GameWorld object stays the same, so the sessions using it and its
+        settings, backing store and spill file carry on. A world backed by a
+        store keeps the store's seed and bounds.
+        """
+        with self._chunks_lock:
+            if self.store is not None:
+                if (seed, radius) != (self.seed, self.radius):
+                    raise ValueError("this world's room store is for a different world")
+                for location, _ in self.modified_rooms():
+                    self.store.put(location, self._generate_room_at(location))
+                    self.store.modified.discard(location)
+            self.seed, self.radius = seed, radius
+            self.chunks.clear()
+            self.dirty_rooms.clear()
+            if self._spill is not None:
+                self._spill.clear()
+            self.timers = WorldTimers()
+            self.awake.clear()
+            # Every room may have changed; readers of the log start over
+            self.room_changes.clear()
+            self.room_change_count += 1
+    
+    def flush(self):
+        """Write every changed room in memory back to the backing store, if there is one."""
+        if self.store is None:
+            return
+        with self._chunks_lock:
+            for location, room in self.loaded_rooms():
+                if location in self.dirty_rooms and self.store.put(location, room, modified=True):
+                    self.dirty_rooms.discard(location)
+            self.store.flush()
+    
+    def _open_spill(self):
+        if self._spill is None:
+            path = self.spill_path
+            spill_dir = None
+            if path is None:
+                spill_dir = tempfile.mkdtemp(prefix="dragonquest_")
+                path = os.path.join(spill_dir, "chunks")
+            self._spill = shelve.open(path, flag="n")
+            weakref.finalize(self, _close_spill, self._spill, spill_dir)
+        return self._spill
+
+def _close_spill(spill, spill_dir: Optional[str]):
+    spill.close()
+    if spill_dir is not None:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+class SaveJournal:
+    """Append-only binary save file with periodic snapshot compaction.
+    
+    After every turn record() appends the new state of whatever changed: the
+    player record (only if it differs from the last one written; it holds
+    the quest log too), every tile of the explored map that gained rooms,
+    and every room marked dirty during the turn. Records are last-write-wins, so a load
+    reads `<path>.snapshot` and applies `<path>.journal` on top of it. Rooms
+    nobody touched are not stored at all; they are regenerated from the world
+    seed. Every `compact_every` records the current state is written out as
+    a new snapshot and the journal starts over.
+    """
+    MAGIC = b"DQJ1"
+    HEADER = struct.Struct("<4sqi")  # magic, world seed, world radius (-1 = unbounded)
+    RECORD = struct.Struct("<BI")  # record type, payload length
+    PLAYER_RECORD, ROOM_RECORD, EXPLORED_RECORD = 1, 2, 3
+    PLAYER = struct.Struct("<8iqqBBiBHH")
+    ROOM = struct.Struct("<qqHH")
+    MONSTER = struct.Struct("<Bi")
+    STACK = struct.Struct("<BI")  # item template id, count
+    QUESTS = struct.Struct("<BB")  # active quests, completed quests
+    QUEST = struct.Struct("<BH")  # quest id, progress
+    TILE = struct.Struct("<qq")  # explored map tile key, then its bits
+    NO_ITEM = 255
+    
+    def __init__(self, path: str, game, compact_every: int = 1000):
+        self.path = path
+        self.compact_every = compact_every
+        self._records = 0
+        self._last_player = None
+        self._journal = None
+        self._explored = None  # the explored map restore() is rebuilding
+        self._bind(game.world)
+        # Where this journal is in the world's room change log; every session
+        # sharing the world reads the log at its own pace
+        self._change_count = game.world.room_change_count
+    
+    def _bind(self, world: GameWorld):
+        self.item_ids = {key: i for i, key in enumerate(world.items_db)}
+        self.items = list(world.items_db.values())
+        self.monster_ids = {monster.name: i for i, monster in enumerate(world.monsters_db.values())}
+        self.monsters = list(world.monsters_db.values())
+        self.quest_ids = list(QuestSystem().available_quests)
+    
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(f"{path}.snapshot")
+    
+    def record(self, game):
+        """Append this turn's changes. Called once per handled command."""
+        world = game.world
+        out = []
+        player = self._encode_player(game)
+        if player != self._last_player:
+            out.append(self._frame(self.PLAYER_RECORD, player))
+            self._last_player = player
+        explored = game.player.explored
+        if explored.changed:
+            for tile_key in explored.take_changed():
+                out.append(self._frame(self.EXPLORED_RECORD, self._encode_tile(tile_key, explored.tiles[tile_key])))
+        # A shared world's rooms belong to every player and aren't restored
+        # from one character's save (see restore), so they aren't written
+        if not game.shared_world:
+            count = world.room_change_count
+            changes = world.changes_since(self._change_count)
+            if changes is None:
+                # More rooms changed than the log remembers; write everything out
+                self.snapshot(game)
+                return
+            self._change_count = count
+            for location in dict.fromkeys(changes):
+                out.append(self._frame(self.ROOM_RECORD, self._encode_room(location, world.get_room(location))))
+        if not out:
+            return
+        
+        self._journal.write(b"".join(out))
+        self._journal.flush()
+        self._records += len(out)
+        if self._records >= self.compact_every:
+            self.snapshot(game)
+    
+    def snapshot(self, game):
+        """Write the full current state as a snapshot and start a new journal."""
+        world = game.world
+        temporary = f"{self.path}.snapshot.tmp"
+        self._change_count = world.room_change_count
+        with open(temporary, "wb") as f:
+            f.write(self._header(world))
+            self._last_player = self._encode_player(game)
+            f.write(self._frame(self.PLAYER_RECORD, self._last_player))
+            explored = game.player.explored
+            explored.take_changed()
+            for tile_key, bits in explored.tiles.items():
+                f.write(self._frame(self.EXPLORED_RECORD, self._encode_tile(tile_key, bits)))
+            for location, room in () if game.shared_world else world.modified_rooms():
+                f.write(self._frame(self.ROOM_RECORD, self._encode_room(location, room)))
+        os.replace(temporary, f"{self.path}.snapshot")
+        
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(f"{self.path}.journal", "wb")
+        self._journal.write(self._header(world))
+        self._journal.flush()
+        self._records = 0
+    
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+    
+    @classmethod
+    def restore(cls, game, path: str) -> "SaveJournal":
+        """Bring back the player and world from a save and keep journaling to it.
+        
+        The save is restored into game.world itself, so a world with a room
+        store keeps writing to it. In a shared world (game.shared_world) the
+        other players' rooms are left as they are and only the character
+        comes back.
+        """
+        with open(f"{path}.snapshot", "rb") as f:
+            data = f.read()
+        try:
+            with open(f"{path}.journal", "rb") as f:
+                journal = f.read()
+        except FileNotFoundError:
+            journal = b""
+        
+        magic, seed, radius = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError("not a Dragon's Quest save")
+        world = game.world
+        if game.shared_world:
+            if (seed, None if radius < 0 else radius) != (world.seed, world.radius):
+                raise ValueError("that save is from a different world")
+        else:
+            world.reset(seed, None if radius < 0 else radius)
+        
+        save = cls(path, game)
+        save._explored = ExploredMap()
+        rooms = not game.shared_world
+        save._apply(game, data, cls.HEADER.size, rooms)
+        if len(journal) >= cls.HEADER.size and cls.HEADER.unpack_from(journal) == (magic, seed, radius):
+            save._apply(game, journal, cls.HEADER.size, rooms)
+        save.snapshot(game)
+        return save
+    
+    def _apply(self, game, data: bytes, offset: int, rooms: bool = True):
+        while offset + self.RECORD.size <= len(data):
+            kind, length = self.RECORD.unpack_from(data, offset)
+            offset += self.RECORD.size
+            if offset + length > len(data):
+                break  # torn write at the end of the journal
+            payload = data[offset:offset + length]
+            offset += length
+            if kind == self.PLAYER_RECORD:
+                self._decode_player(game, payload)
+            elif kind == self.ROOM_RECORD and rooms:
+                self._decode_room(game.world, payload)
+            elif kind == self.EXPLORED_RECORD:
+                tile_key = self.TILE.unpack_from(payload)
+                self._explored.set_tile(tile_key, payload[self.TILE.size:])
+    
+    def _header(self, world: GameWorld) -> bytes:
+        return self.HEADER.pack(self.MAGIC, world.seed, -1 if world.radius is None else world.radius)
+    
+    def _frame(self, kind: int, payload: bytes) -> bytes:
+        return self.RECORD.pack(kind, len(payload)) + payload
+    
+    def _encode_player(self, game) -> bytes:
+        player = game.player
+        name = player.name.encode("utf-8")
+        weapon = self.item_ids[player.equipped_weapon.key] if player.equipped_weapon else self.NO_ITEM
+        armor = self.item_ids[player.equipped_armor.key] if player.equipped_armor else self.NO_ITEM
+        weathers = list(game.weather_system.weather_effects)
+        stacks = player.inventory.distinct()
+        quests = game.quest_system
+        return b"".join([
+            self.PLAYER.pack(player.health, player.max_health, player.attack, player.defense,
+                             player.level, player.exp, player.exp_to_next, player.gold,
+                             player.location[0], player.location[1], weapon, armor,
+                             game.turn_count, weathers.index(game.weather_system.current_weather),
+                             len(name), len(stacks)),
+            name,
+            *(self.STACK.pack(self.item_ids[item.key], count) for item, count in stacks),
+            self.QUESTS.pack(len(quests.active_quests), len(quests.completed_quests)),
+            *(self.QUEST.pack(self.quest_ids.index(quest_id), quest["current_count"])
+              for quest_id, quest in quests.active_quests.items()),
+            *(self.QUEST.pack(self.quest_ids.index(quest_id), 0) for quest_id in quests.completed_quests),
+        ])
+    
+    def _encode_tile(self, tile_key: Tuple[int, int], bits: bytes) -> bytes:
+        return self.TILE.pack(*tile_key) + bytes(bits)
+    
+    def _decode_player(self, game, payload: bytes):
+        (health, max_health, attack, defense, level, exp, exp_to_next, gold, x, y,
+         weapon, armor, turn_count, weather, name_length, stack_count) = self.PLAYER.unpack_from(payload)
+        offset = self.PLAYER.size
+        player = Player(payload[offset:offset + name_length].decode("utf-8"))
+        player.explored = self._explored
+        offset += name_length
+        player.health, player.max_health = health, max_health
+        player.attack, player.defense = attack, defense
+        player.level, player.exp, player.exp_to_next, player.gold = level, exp, exp_to_next, gold
+        player.location = (x, y)
+        player.equipped_weapon = None if weapon == self.NO_ITEM else self.items[weapon]
+        player.equipped_armor = None if armor == self.NO_ITEM else self.items[armor]
+        for _ in range(stack_count):
+            item_id, count = self.STACK.unpack_from(payload, offset)
+            offset += self.STACK.size
+            player.inventory.append(self.items[item_id], count)
+        # The quest log; saves from before it was kept have none
+        quests = QuestSystem()
+        if offset < len(payload):
+            active_count, completed_count = self.QUESTS.unpack_from(payload, offset)
+            offset += self.QUESTS.size
+            for i in range(active_count + completed_count):
+                quest_index, progress = self.QUEST.unpack_from(payload, offset)
+                offset += self.QUEST.size
+                quest_id = self.quest_ids[quest_index]
+                if i < active_count:
+                    quests.accept(quest_id)["current_count"] = progress
+                else:
+                    quests.available_quests.pop(quest_id, None)
+                    quests.completed_quests.append(quest_id)
+        game.quest_system = quests
+        game.player = player
+        game.turn_count = turn_count
+        game.weather_system.current_weather = list(game.weather_system.weather_effects)[weather]
+    
+    def _encode_room(self, location: Tuple[int, int], room: "Room") -> bytes:
+        stacks = room.items.distinct() if room.items else ()
+        return b"".join([
+            self.ROOM.pack(location[0], location[1], len(room.monsters), len(stacks)),
+            *(self.MONSTER.pack(self.monster_ids[monster.name], monster.health) for monster in room.monsters),
+            *(self.STACK.pack(self.item_ids[item.key], count) for item, count in stacks),
+        ])
+    
+    def _decode_room(self, world: GameWorld, payload: bytes):
+        x, y, monster_count, stack_count = self.ROOM.unpack_from(payload)
+        offset = self.ROOM.size
+        room = world.get_room((x, y))
+        room.monsters = ()
+        room.items = ()
+        for _ in range(monster_count):
+            monster_id, health = self.MONSTER.unpack_from(payload, offset)
+            offset += self.MONSTER.size
+            room.add_monster(MonsterInstance(self.monsters[monster_id], health))
+        for _ in range(stack_count):
+            item_id, count = self.STACK.unpack_from(payload, offset)
+            offset += self.STACK.size
+            if not room.items:
+                room.items = Inventory()
+            room.items.append(self.items[item_id], count)
+        world.mark_dirty((x, y))
+
+# Status bars for every fill level, built once rather than on every redraw
+HEALTH_BAR_LENGTH = 20
+EXP_BAR_LENGTH = 15
+HEALTH_BARS = {
+    (filled, color): f"{color}[{'█' * filled}{'░' * (HEALTH_BAR_LENGTH - filled)}] "
+    for filled in range(HEALTH_BAR_LENGTH + 1) for color in ("🟢", "🟡", "🟠", "🔴")
+}
+EXP_BARS = {filled: f"⭐[{'▓' * filled}{'▒' * (EXP_BAR_LENGTH - filled)}] " for filled in range(EXP_BAR_LENGTH + 1)}
+
+@dataclass(frozen=True)
+class CommandSpec:
+    """One command: its word, the Game method that runs it, and how it takes arguments.
+    
+    `takes_argument` commands get the rest of the line (if any) as one
+    string; `argument` is a fixed argument instead, so that "n" can simply
+    be cmd_go("north").
+    """
+    name: str
+    handler: str
+    aliases: Tuple[str, ...] = ()
+    takes_argument: bool = False
+    argument: Optional[str] = None
+
+class CommandGrammar:
+    """Resolves typed words to commands.
+    
+    Every command name and alias matches exactly, and any prefix of a name
+    that only one command starts with matches too ("inv", "eq", "sa"). The
+    lookup table is compiled when commands are registered at import time
+    and shared by every Game, so resolving a word is one dict lookup.
+    """
+    def __init__(self, specs=()):
+        self.specs = list(specs)
+        self._table = self._compile()
+    
+    def add(self, spec: CommandSpec):
+        self.specs.append(spec)
+        self._table = self._compile()
+    
+    def _compile(self) -> Dict[str, object]:
+        # word -> CommandSpec, or a tuple of candidate names if the prefix is ambiguous
+        candidates = {}
+        for spec in self.specs:
+            for end in range(1, len(spec.name) + 1):
+                candidates.setdefault(spec.name[:end], set()).add(spec.name)
+        by_name = {spec.name: spec for spec in self.specs}
+        table = {prefix: by_name[next(iter(names))] if len(names) == 1 else tuple(sorted(names))
+                 for prefix, names in candidates.items()}
+        for spec in self.specs:
+            for word in (spec.name,) + spec.aliases:
+                table[word] = spec
+        return table
+    
+    def resolve(self, word: str):
+        """The CommandSpec for `word`, a tuple of candidate names if it is ambiguous, or None."""
+        return self._table.get(word)
+
+# One character per room type on the map; a village with a shop is drawn as "V"
+MAP_SYMBOLS = {
+    "forest": "♣", "cave": "o", "ruins": "#", "mountain": "^", "swamp": "~", "desert": ":",
+    "village": "v", "dungeon": "D", "tower": "T", "library": "L", "armory": "A", "treasury": "$",
+}
+
+class MapView:
+    """The explored map around a player, redrawn incrementally.
+    
+    Each cell is two characters: the room's symbol (or "@" for the player)
+    and "!" if monsters are there. Cells and rows are cached between draws;
+    a redraw only recomputes cells explored or changed since the last one
+    (from ExploredMap.recent and the world's room change log), the cells the
+    player left and entered, and cells that scrolled into view. The cost of
+    a redraw depends on the window size, not on how much has been explored.
+    """
+    def __init__(self, game, width: int = 25, height: int = 13):
+        self.game = game
+        self.width = width
+        self.height = height
+        self.cells = {}
+        self.rows = {}
+        self._explored = None
+        self._change_count = game.world.room_change_count
+        self._player_at = None
+        self._left = None
+    
+    def _cell(self, location: Tuple[int, int], explored: ExploredMap) -> str:
+        if location not in explored:
+            return "  "
+        room = self.game.world.get_room(location)
+        symbol = "V" if room.special == "shop" else MAP_SYMBOLS.get(room.type, "?")
+        if location == self.game.player.location:
+            symbol = "@"
+        return symbol + ("!" if room.monsters else " ")
+    
+    def render(self) -> List[str]:
+        player = self.game.player
+        world = self.game.world
+        explored = player.explored
+        px, py = player.location
+        
+        # Work out which cached cells are stale
+        recent = explored.take_recent()
+        changes = world.changes_since(self._change_count)
+        self._change_count = world.room_change_count
+        if explored is not self._explored or recent is None or changes is None:
+            self.cells.clear()
+            self.rows.clear()
+            self._explored = explored
+            stale = ()
+        else:
+            stale = set(recent)
+            stale.update(changes)
+            stale.add(player.location)
+            if self._player_at is not None:
+                stale.add(self._player_at)
+        self._player_at = player.location
+        
+        left = px - self.width // 2
+        top = py + self.height // 2
+        if left != self._left:
+            self.rows.clear()
+            self._left = left
+        for location in stale:
+            self.cells.pop(location, None)
+            self.rows.pop(location[1], None)
+        
+        lines = []
+        cells = self.cells
+        for y in range(top, top - self.height, -1):
+            row = self.rows.get(y)
+            if row is None:
+                parts = []
+                for x in range(left, left + self.width):
+                    cell = cells.get((x, y))
+                    if cell is None:
+                        cell = cells[(x, y)] = self._cell((x, y), explored)
+                    parts.append(cell)
+                row = self.rows[y] = "".join(parts)
+            lines.append(row)
+        
+        # Forget cells that scrolled well out of view
+        if len(cells) > 4 * self.width * self.height:
+            self.cells = {location: cell for location, cell in cells.items()
+                          if left <= location[0] < left + self.width and top - self.height < location[1] <= top}
+        return lines
+
+class CommandProfiler:
+    """Per-command call counts, latency percentiles and sampled allocations.
+    
+    Latencies go into log-scale histograms (eight buckets per doubling, so
+    percentiles are accurate to about 5%) and cost O(1) memory per command.
+    Every `sample_every`-th call of a command runs under tracemalloc to
+    measure the peak memory it allocates; those calls are left out of the
+    latency figures because tracing slows them down.
+    
+    Answers to a prompt are charged to the command that asked it, so every
+    round of a fight counts towards enhanced_fight. One profiler may be
+    shared by many sessions.
+    """
+    BUCKETS_PER_DOUBLING = 8
+    
+    def __init__(self, sample_every: int = 16):
+        self.sample_every = sample_every
+        self.stats = {}  # command -> [calls, total seconds, histogram, alloc samples, alloc bytes]
+        self._interactions = {}  # pending interaction -> command that started it
+        self._lock = threading.Lock()
+    
+    def run(self, game, line: str):
+        """Handle `line` in `game` and record how long it took."""
+        pending = game.pending
+        name = self._interactions.get(pending, "(prompt)") if pending is not None else self._command_name(game, line)
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = [0, 0.0, Counter(), 0, 0]
+            stats[0] += 1
+            sampled = self.sample_every and stats[0] % self.sample_every == 1
+        
+        if sampled:
+            allocated, elapsed = self._traced(game, line)
+        else:
+            start = time.perf_counter()
+            game._dispatch(line)
+            elapsed = time.perf_counter() - start
+        
+        with self._lock:
+            if game.pending is not pending:
+                self._interactions.pop(pending, None)
+                if game.pending is not None:
+                    self._interactions[game.pending] = name
+            if sampled:
+                stats[3] += 1
+                stats[4] += allocated
+            else:
+                stats[1] += elapsed
+                stats[2][self._bucket(elapsed)] += 1
+    
+    def _traced(self, game, line: str) -> Tuple[int, float]:
+        already_tracing = tracemalloc.is_tracing()
+        if already_tracing:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        else:
+            before = 0
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            game._dispatch(line)
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            if not already_tracing:
+                tracemalloc.stop()
+        return max(0, peak - before), elapsed
+    
+    @staticmethod
+    def _command_name(game, line: str) -> str:
+        words = line.split(maxsplit=1)
+        if not words:
+            return "(empty)"
+        spec = game.grammar.resolve(words[0].lower())
+        if not isinstance(spec, CommandSpec):
+            return "(unknown)"
+        return getattr(game, spec.handler).__name__
+    
+    def _bucket(self, seconds: float) -> int:
+        return int(math.log2(max(seconds, 1e-9)) * self.BUCKETS_PER_DOUBLING)
+    
+    def _percentile(self, histogram: Counter, q: float) -> float:
+        total = sum(histogram.values())
+        if not total:
+            return 0.0
+        seen = 0
+        for bucket in sorted(histogram):
+            seen += histogram[bucket]
+            if seen >= q / 100 * total:
+                return 2 ** ((bucket + 0.5) / self.BUCKETS_PER_DOUBLING)
+        return 0.0
+    
+    def report(self) -> List[dict]:
+        """One summary per command, most total time first."""
+        with self._lock:
+            rows = []
+            for name, (calls, total, histogram, samples, allocated) in self.stats.items():
+                timed = sum(histogram.values())
+                rows.append({
+                    "command": name,
+                    "calls": calls,
+                    "total_ms": total * 1000,
+                    "mean_ms": total / timed * 1000 if timed else 0.0,
+                    "p50_ms": self._percentile(histogram, 50) * 1000,
+                    "p99_ms": self._percentile(histogram, 99) * 1000,
+                    "alloc_samples": samples,
+                    "alloc_bytes": allocated // samples if samples else 0,
+                })
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+    
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+    
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"sample_every": self.sample_every, "commands": self.report()}, f, indent=2)
 
 class Game:
-    def __init__(self):
+    grammar = CommandGrammar([
+        CommandSpec("look", "cmd_look", ("l",)),
+        CommandSpec("go", "cmd_go", takes_argument=True),
+        CommandSpec("north", "cmd_go", ("n",), argument="north"),
+        CommandSpec("south", "cmd_go", ("s",), argument="south"),
+        CommandSpec("east", "cmd_go", ("e",), argument="east"),
+        CommandSpec("west", "cmd_go", ("w",), argument="west"),
+        CommandSpec("inventory", "cmd_inventory", ("i",)),
+        CommandSpec("stats", "cmd_stats"),
+        CommandSpec("fight", "cmd_fight", ("f",)),
+        CommandSpec("take", "cmd_take", ("get",), takes_argument=True),
+        CommandSpec("use", "cmd_use", takes_argument=True),
+        CommandSpec("equip", "cmd_equip", takes_argument=True),
+        CommandSpec("unequip", "cmd_unequip", takes_argument=True),
+        CommandSpec("shop", "cmd_shop"),
+        CommandSpec("help", "cmd_help"),
+        CommandSpec("quit", "cmd_quit"),
+        CommandSpec("save", "cmd_save"),
+        CommandSpec("load", "cmd_load"),
+    ])
+    
+    def __init__(self, world: Optional[GameWorld] = None):
         self.player = None
-        self.world = GameWorld()
+        self.world = world if world is not None else GameWorld()
         self.game_over = False
-        self.commands = {
-            "look": self.cmd_look,
-            "l": self.cmd_look,
-            "go": self.cmd_go,
-            "north": lambda: self.cmd_go("north"),
-            "south": lambda: self.cmd_go("south"),
-            "east": lambda: self.cmd_go("east"),
-            "west": lambda: self.cmd_go("west"),
-            "n": lambda: self.cmd_go("north"),
-            "s": lambda: self.cmd_go("south"),
-            "e": lambda: self.cmd_go("east"),
-            "w": lambda: self.cmd_go("west"),
-            "inventory": self.cmd_inventory,
-            "i": self.cmd_inventory,
-            "stats": self.cmd_stats,
-            "fight": self.cmd_fight,
-            "f": self.cmd_fight,
-            "take": self.cmd_take,
-            "get": self.cmd_take,
-            "use": self.cmd_use,
-            "equip": self.cmd_equip,
-            "unequip": self.cmd_unequip,
-            "shop": self.cmd_shop,
-            "help": self.cmd_help,
-            "quit": self.cmd_quit,
-            "save": self.cmd_save,
-            "load": self.cmd_load,
-        }
+        self.events = []
+        self.pending = None
+        # Pacing: cosmetic pauses are emitted as events for the front end to
+        # honour; turbo sessions (bots, tests, replays) skip them entirely
+        self.turbo = False
+        self.move_delay = 1.0
+        # Saving: once the player saves or loads, every turn is journaled to
+        # save_path; a server gives every character a path of its own
+        self.save_path = "dragonquest"
+        self.journal = None
+        # Set when other sessions play in the same world (see SaveJournal.restore)
+        self.shared_world = False
+        # Every random outcome of a session comes from its own stream, so a
+        # session can be replayed from its seed and inputs (see replay.py)
+        self.rng_seed = random.randrange(2 ** 63)
+        self.rng = random.Random(self.rng_seed)
+        self.recorder = None
+        # Instrumentation: a CommandProfiler, or None to skip it entirely
+        self.profiler = None
+        self.bus = EventBus()
     
-    def start_game(self):
-        print("🐉 Welcome to Dragon's Quest! 🐉")
-        print("=" * 50)
-        
-        name = input("Enter your character's name: ").strip()
+    def output(self, text: str = ""):
+        self.events.append(GameEvent("message", text))
+    
+    def pause(self, seconds: float):
+        """Ask the front end for a cosmetic pause; the engine itself never sleeps."""
+        if seconds > 0 and not self.turbo:
+            self.events.append(GameEvent("pause", "", seconds))
+    
+    def drain_events(self) -> List[GameEvent]:
+        events, self.events = self.events, []
+        return events
+    
+    def begin(self, name: str) -> List[GameEvent]:
+        """Create the player and return the opening events."""
+        if self.recorder is not None:
+            self.recorder.record(name)
+        name = name.strip()
         if not name:
             name = "Adventurer"
         
         self.player = Player(name)
         
-        print(f"\nWelcome, {self.player.name}!")
-        print("Type 'help' for a list of commands.")
-        print("Your adventure begins in a peaceful village...")
+        self.output(f"\nWelcome, {self.player.name}!")
+        self.output("Type 'help' for a list of commands.")
+        self.output("Your adventure begins in a peaceful village...")
         
         self.cmd_look()
-        
-        while not self.game_over:
-            try:
-                command = input(f"\n[{self.player.name}] > ").strip().lower()
+        return self.drain_events()
+    
+    def handle(self, line: str) -> List[GameEvent]:
+        """Feed one line of input to the engine and return the resulting events.
+        
+        If a command is waiting on a choice (a combat action, a potion or a
+        shop purchase) the line answers that prompt; otherwise it is parsed
+        as a new command.
+        """
+        if self.game_over:
+            return []
+        if self.recorder is not None:
+            self.recorder.record(line)
+        # Several commands can be sent at once separated by ';' ("n;n;e;f")
+        for part in line.split(";") if ";" in line else (line,):
+            if self.game_over:
+                break
+            if self.profiler is None:
+                self._dispatch(part)
+            else:
+                self.profiler.run(self, part)
+        
+        # A turn that ends in death isn't journaled, so the save stays at the
+        # last turn the character was alive
+        if self.journal is not None and self.player.health > 0:
+            self.journal.record(self)
+        if self.game_over:
+            self.events.append(GameEvent("game_over", ""))
+        return self.drain_events()
+    
+    def _dispatch(self, line: str):
+        try:
+            if self.pending:
+                self._advance(self.pending, line.strip())
+            else:
+                command = line.strip().lower()
                 if not command:
-                    continue
+                    return
                 
                 parts = command.split()
-                cmd = parts[0]
-                args = parts[1:] if len(parts) > 1 else []
+                spec = self.grammar.resolve(parts[0])
                 
-                if cmd in self.commands:
-                    if args and cmd in ["go", "take", "get", "use", "equip", "unequip"]:
-                        self.commands[cmd](" ".join(args))
+                if isinstance(spec, CommandSpec):
+                    handler = getattr(self, spec.handler)
+                    if spec.argument is not None:
+                        result = handler(spec.argument)
+                    elif spec.takes_argument and len(parts) > 1:
+                        result = handler(" ".join(parts[1:]))
                     else:
-                        self.commands[cmd]()
-                else:
-                    print("Unknown command. Type 'help' for available commands.")
-                
-                # Check if player died
-                if self.player.health <= 0:
-                    print("\n💀 You have died! Game Over.")
-                    print(f"Final level: {self.player.level}")
-                    print(f"Gold collected: {self.player.gold}")
-                    self.game_over = True
+                        result = handler()
                     
+                    if inspect.isgenerator(result):
+                        self._advance(self._pinned(self.player.location, result))
+                elif spec:
+                    self.output(f"'{parts[0]}' could mean: {', '.join(spec)}.")
+                else:
+                    self.output("Unknown command. Type 'help' for available commands.")
+            
+            # Check if player died
+            if self.player.health <= 0 and not self.game_over:
+                if self.pending is not None:
+                    self.pending.close()  # unpins the room the fight was in
+                self.pending = None
+                self.output("\n💀 You have died! Game Over.")
+                self.output(f"Final level: {self.player.level}")
+                self.output(f"Gold collected: {self.player.gold}")
+                self.game_over = True
+        except Exception as e:
+            self.pending = None
+            self.output(f"An error occurred: {e}")
+    
+    def _advance(self, interaction, answer: Optional[str] = None):
+        # Interactive commands are generators that yield their prompt text and
+        # receive the player's answer back from send().
+        self.pending = None
+        try:
+            prompt = next(interaction) if answer is None else interaction.send(answer)
+        except StopIteration:
+            return
+        self.pending = interaction
+        self.events.append(GameEvent("prompt", prompt))
+    
+    def _pinned(self, location: Tuple[int, int], interaction):
+        # An interaction holds references into the room it started in, so the
+        # room must not be evicted (and reloaded as a copy) until it finishes
+        self.world.pin(location)
+        try:
+            return (yield from interaction)
+        finally:
+            self.world.unpin(location)
+    
+    def start_game(self):
+        print("🐉 Welcome to Dragon's Quest! 🐉")
+        print("=" * 50)
+        
+        name = input("Enter your character's name: ")
+        prompt = self._render(self.begin(name))
+        
+        while not self.game_over:
+            try:
+                line = input(prompt or f"\n[{self.player.name}] > ")
+                prompt = self._render(self.handle(line))
             except KeyboardInterrupt:
                 print("\n\nThanks for playing Dragon's Quest!")
                 break
-            except Exception as e:
-                print(f"An error occurred: {e}")
+    
+    def _render(self, events: List[GameEvent]) -> Optional[str]:
+        # Terminal adapter: write each command's messages out in one go (split
+        # only where the game asks for a pause) and hand back any pending prompt
+        prompt = None
+        lines = []
+        for event in events:
+            if event.kind == "message":
+                lines.append(event.text)
+            elif event.kind == "pause":
+                self._write_lines(lines)
+                lines = []
+                time.sleep(event.duration)
+            elif event.kind == "prompt":
+                prompt = event.text
+        self._write_lines(lines)
+        return prompt
+    
+    def _write_lines(self, lines: List[str]):
+        if lines:
+            lines.append("")
+            sys.stdout.write("\n".join(lines))
+            sys.stdout.flush()
     
     def cmd_look(self):
         current_room = self.world.get_room(self.player.location)
         if not current_room:
-            print("You are in an unknown location.")
+            self.output("You are in an unknown location.")
             return
         
-        print(f"\n📍 {current_room['type'].title()}")
-        print(f"   {current_room['description']}")
+        self.output(f"\n📍 {current_room.type.title()}")
+        self.output(f"   {current_room.description}")
         
-        if current_room['monsters']:
-            print(f"\n⚔️  Enemies present:")
-            for monster in current_room['monsters']:
+        if current_room.monsters:
+            self.output(f"\n⚔️  Enemies present:")
+            for monster in current_room.monsters:
                 health_bar = self._create_health_bar(monster.health, monster.max_health)
-                print(f"   • {monster.name} {health_bar}")
+                self.output(f"   • {monster.name} {health_bar}")
         
-        if current_room['items']:
-            print(f"\n💰 Items here:")
-            for item in current_room['items']:
-                print(f"   • {item.name}: {item.description}")
+        if current_room.items:
+            self.output(f"\n💰 Items here:")
+            for item, count in current_room.items.distinct():
+                quantity = f" x{count}" if count > 1 else ""
+                self.output(f"   • {item.name}{quantity}: {item.description}")
         
-        if current_room.get('special') == 'shop':
-            print(f"\n🏪 There's a merchant here. Type 'shop' to browse wares.")
+        if current_room.special == 'shop':
+            self.output(f"\n🏪 There's a merchant here. Type 'shop' to browse wares.")
         
         # Show available exits
-        exits = []
-        x, y = self.player.location
-        for direction, (dx, dy) in [("north", (0, 1)), ("south", (0, -1)), 
-                                   ("east", (1, 0)), ("west", (-1, 0))]:
-            if (x + dx, y + dy) in self.world.rooms:
-                exits.append(direction)
-        
+        exits = self.world.exits(self.player.location)
         if exits:
-            print(f"\n🚪 Exits: {', '.join(exits)}")
+            self.output(f"\n🚪 Exits: {', '.join(exits)}")
     
     def cmd_go(self, direction: str = None):
         if not direction:
-            print("Go where? (north, south, east, west)")
+            self.output("Go where? (north, south, east, west)")
             return
         
         direction = direction.lower()
@@ -351,12 +1716,12 @@ class Game:
         }
         
         if direction not in direction_map:
-            print("Invalid direction. Use north, south, east, or west.")
+            self.output("Invalid direction. Use north, south, east, or west.")
             return
         
         current_room = self.world.get_room(self.player.location)
-        if current_room and current_room['monsters']:
-            print("You cannot leave while enemies are present! Fight or flee!")
+        if current_room and current_room.monsters:
+            self.output("You cannot leave while enemies are present! Fight or flee!")
             return
         
         dx, dy = direction_map[direction]
@@ -364,31 +1729,35 @@ class Game:
         new_y = self.player.location[1] + dy
         new_location = (new_x, new_y)
         
-        if new_location not in self.world.rooms:
-            print("You cannot go that way.")
+        if not self.world.has_room(new_location):
+            self.output("You cannot go that way.")
             return
         
+        first_visit = new_location not in self.player.explored
         self.player.location = new_location
-        print(f"You travel {direction}...")
-        time.sleep(1)
+        self.output(f"You travel {direction}...")
+        self.pause(self.move_delay)
         self.cmd_look()
+        if first_visit:
+            self.bus.publish("move", self.world.get_room(new_location).type)
     
     def cmd_inventory(self):
         if not self.player.inventory:
-            print("Your inventory is empty.")
+            self.output("Your inventory is empty.")
             return
         
-        print(f"\n🎒 {self.player.name}'s Inventory:")
-        print(f"   Gold: {self.player.gold}")
+        self.output(f"\n🎒 {self.player.name}'s Inventory:")
+        self.output(f"   Gold: {self.player.gold}")
         
         if self.player.equipped_weapon:
-            print(f"   Weapon: {self.player.equipped_weapon.name} (+{self.player.equipped_weapon.effect} attack)")
+            self.output(f"   Weapon: {self.player.equipped_weapon.name} (+{self.player.equipped_weapon.effect} attack)")
         if self.player.equipped_armor:
-            print(f"   Armor: {self.player.equipped_armor.name} (+{self.player.equipped_armor.effect} defense)")
+            self.output(f"   Armor: {self.player.equipped_armor.name} (+{self.player.equipped_armor.effect} defense)")
         
-        print("\n   Items:")
-        for item in self.player.inventory:
-            print(f"   • {item.name}: {item.description}")
+        self.output("\n   Items:")
+        for item, count in self.player.inventory.distinct():
+            quantity = f" x{count}" if count > 1 else ""
+            self.output(f"   • {item.name}{quantity}: {item.description}")
     
     def cmd_stats(self):
         weapon_bonus = self.player.equipped_weapon.effect if self.player.equipped_weapon else 0
@@ -397,194 +1766,193 @@ class Game:
         health_bar = self._create_health_bar(self.player.health, self.player.max_health)
         exp_bar = self._create_exp_bar(self.player.exp, self.player.exp_to_next)
         
-        print(f"\n📊 {self.player.name}'s Stats:")
-        print(f"   Level: {self.player.level}")
-        print(f"   Health: {health_bar} ({self.player.health}/{self.player.max_health})")
-        print(f"   Experience: {exp_bar} ({self.player.exp}/{self.player.exp_to_next})")
-        print(f"   Attack: {self.player.attack} (+{weapon_bonus}) = {self.player.get_total_attack()}")
-        print(f"   Defense: {self.player.defense} (+{armor_bonus}) = {self.player.get_total_defense()}")
-        print(f"   Gold: {self.player.gold}")
+        self.output(f"\n📊 {self.player.name}'s Stats:")
+        self.output(f"   Level: {self.player.level}")
+        self.output(f"   Health: {health_bar} ({self.player.health}/{self.player.max_health})")
+        self.output(f"   Experience: {exp_bar} ({self.player.exp}/{self.player.exp_to_next})")
+        self.output(f"   Attack: {self.player.attack} (+{weapon_bonus}) = {self.player.get_total_attack()}")
+        self.output(f"   Defense: {self.player.defense} (+{armor_bonus}) = {self.player.get_total_defense()}")
+        self.output(f"   Gold: {self.player.gold}")
     
     def cmd_fight(self):
         current_room = self.world.get_room(self.player.location)
-        if not current_room or not current_room['monsters']:
-            print("There are no enemies to fight here.")
+        if not current_room or not current_room.monsters:
+            self.output("There are no enemies to fight here.")
             return
         
-        monster = current_room['monsters'][0]  # Fight first monster
-        print(f"\n⚔️  Battle begins with {monster.name}!")
-        print(f"   {monster.description}")
+        monster = current_room.monsters[0]  # Fight first monster
+        self.world.mark_dirty(self.player.location)
+        self.output(f"\n⚔️  Battle begins with {monster.name}!")
+        self.output(f"   {monster.description}")
         
         while monster.health > 0 and self.player.health > 0:
             # Player's turn
-            print(f"\n{self.player.name}: {self._create_health_bar(self.player.health, self.player.max_health)}")
-            print(f"{monster.name}: {self._create_health_bar(monster.health, monster.max_health)}")
+            self.output(f"\n{self.player.name}: {self._create_health_bar(self.player.health, self.player.max_health)}")
+            self.output(f"{monster.name}: {self._create_health_bar(monster.health, monster.max_health)}")
             
-            action = input("Choose action: (a)ttack, (r)un, (u)se item: ").lower()
+            action = (yield "Choose action: (a)ttack, (r)un, (u)se item: ").lower()
             
             if action == 'a' or action == 'attack':
                 # Player attacks
-                damage = random.randint(self.player.get_total_attack() - 3, self.player.get_total_attack() + 3)
+                damage = self.rng.randint(self.player.get_total_attack() - 3, self.player.get_total_attack() + 3)
                 actual_damage = max(1, damage - monster.defense)
                 monster.health -= actual_damage
-                print(f"You deal {actual_damage} damage to {monster.name}!")
+                self.output(f"You deal {actual_damage} damage to {monster.name}!")
                 
                 if monster.health <= 0:
-                    print(f"\n🎉 You defeated {monster.name}!")
+                    self.output(f"\n🎉 You defeated {monster.name}!")
                     
                     # Reward exp and gold
                     self.player.exp += monster.exp_value
-                    gold_reward = random.randint(*monster.gold_drop)
+                    gold_reward = self.rng.randint(*monster.gold_drop)
                     self.player.gold += gold_reward
                     
-                    print(f"   +{monster.exp_value} EXP, +{gold_reward} gold")
+                    self.output(f"   +{monster.exp_value} EXP, +{gold_reward} gold")
                     
                     # Remove monster from room
-                    current_room['monsters'].remove(monster)
+                    current_room.remove_monster(monster)
                     
                     # Check for level up
-                    if self.player.level_up():
+                    if self.player.level_up(self.output, self.rng):
                         pass  # Level up message already printed
                     
                     break
             
             elif action == 'r' or action == 'run':
-                if random.random() < 0.7:  # 70% chance to run successfully
-                    print("You successfully fled from battle!")
+                if self.rng.random() < 0.7:  # 70% chance to run successfully
+                    self.output("You successfully fled from battle!")
                     return
                 else:
-                    print("You failed to escape!")
+                    self.output("You failed to escape!")
             
             elif action == 'u' or action == 'use':
-                potions = [item for item in self.player.inventory if item.type == ItemType.POTION]
+                potions = [(item, count) for item, count in self.player.inventory.distinct()
+                           if item.type == ItemType.POTION]
                 if not potions:
-                    print("You have no potions to use!")
+                    self.output("You have no potions to use!")
                     continue
                 
-                print("Available potions:")
-                for i, potion in enumerate(potions):
-                    print(f"   {i + 1}. {potion.name}")
+                self.output("Available potions:")
+                for i, (potion, count) in enumerate(potions):
+                    quantity = f" x{count}" if count > 1 else ""
+                    self.output(f"   {i + 1}. {potion.name}{quantity}")
                 
                 try:
-                    choice = int(input("Choose potion (number): ")) - 1
+                    choice = int((yield "Choose potion (number): ")) - 1
                     if 0 <= choice < len(potions):
-                        potion = potions[choice]
+                        potion = potions[choice][0]
                         healed = self.player.heal(potion.effect)
                         self.player.inventory.remove(potion)
-                        print(f"You used {potion.name} and restored {healed} health!")
+                        self.output(f"You used {potion.name} and restored {healed} health!")
                     else:
-                        print("Invalid choice!")
+                        self.output("Invalid choice!")
                         continue
                 except ValueError:
-                    print("Invalid input!")
+                    self.output("Invalid input!")
                     continue
             else:
-                print("Invalid action!")
+                self.output("Invalid action!")
                 continue
             
             # Monster's turn (if still alive)
             if monster.health > 0:
-                damage = random.randint(monster.attack - 2, monster.attack + 2)
+                damage = self.rng.randint(monster.attack - 2, monster.attack + 2)
                 actual_damage = self.player.take_damage(damage)
-                print(f"{monster.name} attacks you for {actual_damage} damage!")
+                self.output(f"{monster.name} attacks you for {actual_damage} damage!")
                 
                 if self.player.health <= 0:
                     return  # Player died, will be handled in main loop
     
     def cmd_take(self, item_name: str = None):
         if not item_name:
-            print("Take what?")
+            self.output("Take what?")
             return
         
         current_room = self.world.get_room(self.player.location)
-        if not current_room or not current_room['items']:
-            print("There are no items here.")
+        if not current_room or not current_room.items:
+            self.output("There are no items here.")
             return
         
-        item_name = item_name.lower()
-        for item in current_room['items'][:]:  # Copy list to avoid modification issues
-            if item_name in item.name.lower():
-                self.player.inventory.append(item)
-                current_room['items'].remove(item)
-                print(f"You picked up {item.name}.")
-                return
+        with self.world.room_lock(self.player.location):
+            # Re-check under the lock: another player may have just taken it
+            item = current_room.items.find(item_name) if current_room.items else None
+            if item is not None:
+                current_room.remove_item(item)
+        
+        if item is None:
+            self.output("That item is not here.")
+            return
         
-        print("That item is not here.")
+        self.player.inventory.append(item)
+        self.world.mark_dirty(self.player.location)
+        self.output(f"You picked up {item.name}.")
+        self.bus.publish("pickup", item.key)
     
     def cmd_use(self, item_name: str = None):
         if not item_name:
-            print("Use what?")
+            self.output("Use what?")
             return
         
-        item_name = item_name.lower()
-        for item in self.player.inventory[:]:
-            if item_name in item.name.lower():
-                if item.type == ItemType.POTION:
-                    healed = self.player.heal(item.effect)
-                    self.player.inventory.remove(item)
-                    print(f"You used {item.name} and restored {healed} health!")
-                    return
-                else:
-                    print("You cannot use that item.")
-                    return
-        
-        print("You don't have that item.")
+        item = self.player.inventory.find(item_name)
+        if item is None:
+            self.output("You don't have that item.")
+        elif item.type == ItemType.POTION:
+            healed = self.player.heal(item.effect)
+            self.player.inventory.remove(item)
+            self.output(f"You used {item.name} and restored {healed} health!")
+        else:
+            self.output("You cannot use that item.")
     
     def cmd_equip(self, item_name: str = None):
         if not item_name:
-            print("Equip what?")
+            self.output("Equip what?")
             return
         
-        item_name = item_name.lower()
-        for item in self.player.inventory:
-            if item_name in item.name.lower():
-                if item.type == ItemType.WEAPON:
-                    if self.player.equipped_weapon:
-                        self.player.inventory.append(self.player.equipped_weapon)
-                    self.player.equipped_weapon = item
-                    self.player.inventory.remove(item)
-                    print(f"You equipped {item.name}.")
-                    return
-                elif item.type == ItemType.ARMOR:
-                    if self.player.equipped_armor:
-                        self.player.inventory.append(self.player.equipped_armor)
-                    self.player.equipped_armor = item
-                    self.player.inventory.remove(item)
-                    print(f"You equipped {item.name}.")
-                    return
-                else:
-                    print("You cannot equip that item.")
-                    return
-        
-        print("You don't have that item.")
+        item = self.player.inventory.find(item_name)
+        if item is None:
+            self.output("You don't have that item.")
+        elif item.type == ItemType.WEAPON:
+            if self.player.equipped_weapon:
+                self.player.inventory.append(self.player.equipped_weapon)
+            self.player.equipped_weapon = item
+            self.player.inventory.remove(item)
+            self.output(f"You equipped {item.name}.")
+        elif item.type == ItemType.ARMOR:
+            if self.player.equipped_armor:
+                self.player.inventory.append(self.player.equipped_armor)
+            self.player.equipped_armor = item
+            self.player.inventory.remove(item)
+            self.output(f"You equipped {item.name}.")
+        else:
+            self.output("You cannot equip that item.")
     
     def cmd_unequip(self, item_type: str = None):
         if not item_type:
-            print("Unequip what? (weapon/armor)")
+            self.output("Unequip what? (weapon/armor)")
             return
         
         item_type = item_type.lower()
         if item_type in ["weapon", "sword"]:
             if self.player.equipped_weapon:
                 self.player.inventory.append(self.player.equipped_weapon)
-                print(f"You unequipped {self.player.equipped_weapon.name}.")
+                self.output(f"You unequipped {self.player.equipped_weapon.name}.")
                 self.player.equipped_weapon = None
             else:
-                print("You don't have a weapon equipped.")
+                self.output("You don't have a weapon equipped.")
         elif item_type == "armor":
             if self.player.equipped_armor:
                 self.player.inventory.append(self.player.equipped_armor)
-                print(f"You unequipped {self.player.equipped_armor.name}.")
+                self.output(f"You unequipped {self.player.equipped_armor.name}.")
                 self.player.equipped_armor = None
             else:
-                print("You don't have armor equipped.")
+                self.output("You don't have armor equipped.")
         else:
-            print("Invalid item type. Use 'weapon' or 'armor'.")
+            self.output("Invalid item type. Use 'weapon' or 'armor'.")
     
     def cmd_shop(self):
         current_room = self.world.get_room(self.player.location)
-        if not current_room or current_room.get('special') != 'shop':
-            print("There's no shop here.")
+        if not current_room or current_room.special != 'shop':
+            self.output("There's no shop here.")
             return
         
         shop_items = [
@@ -595,113 +1963,109 @@ class Game:
         ]
         
         while True:
-            print(f"\n🏪 Welcome to the Village Shop!")
-            print(f"   Your gold: {self.player.gold}")
-            print(f"\n   Items for sale:")
+            self.output(f"\n🏪 Welcome to the Village Shop!")
+            self.output(f"   Your gold: {self.player.gold}")
+            self.output(f"\n   Items for sale:")
             
             for i, item in enumerate(shop_items):
-                print(f"   {i + 1}. {item.name} - {item.value} gold")
-                print(f"      {item.description}")
+                self.output(f"   {i + 1}. {item.name} - {item.value} gold")
+                self.output(f"      {item.description}")
             
-            print(f"\n   0. Leave shop")
+            self.output(f"\n   0. Leave shop")
             
             try:
-                choice = int(input("What would you like to buy? "))
+                choice = int((yield "What would you like to buy? "))
                 if choice == 0:
-                    print("Thanks for visiting!")
+                    self.output("Thanks for visiting!")
                     break
                 elif 1 <= choice <= len(shop_items):
                     item = shop_items[choice - 1]
                     if self.player.gold >= item.value:
                         self.player.gold -= item.value
-                        # Create a copy of the item
-                        new_item = Item(**item.__dict__)
-                        self.player.inventory.append(new_item)
-                        print(f"You bought {item.name}!")
+                        self.player.inventory.append(item)
+                        self.output(f"You bought {item.name}!")
                     else:
-                        print("You don't have enough gold!")
+                        self.output("You don't have enough gold!")
                 else:
-                    print("Invalid choice!")
+                    self.output("Invalid choice!")
             except ValueError:
-                print("Invalid input!")
+                self.output("Invalid input!")
     
     def cmd_help(self):
-        print("\n📖 Available Commands:")
-        print("   Movement: north/n, south/s, east/e, west/w, go <direction>")
-        print("   Combat: fight/f")
-        print("   Items: take/get <item>, use <item>, equip <item>, unequip <type>")
-        print("   Information: look/l, inventory/i, stats")
-        print("   Other: shop (in villages), help, save, load, quit")
+        self.output("\n📖 Available Commands:")
+        self.output("   Movement: north/n, south/s, east/e, west/w, go <direction>, travel <x> <y>/village")
+        self.output("   Combat: fight/f")
+        self.output("   Items: take/get <item>, use <item>, equip <item>, unequip <type>")
+        self.output("   Information: look/l, map, inventory/i, stats, odds, perf [on/off/reset]")
+        self.output("   Quests: quests/q, accept <quest>, abandon <quest>")
+        self.output("   Other: shop (in villages), help, save, load, quit")
+        self.output("   Commands can be shortened (inv, eq) and chained with ';' (n;n;e;f)")
     
     def cmd_quit(self):
-        print("Thanks for playing Dragon's Quest!")
+        self.output("Thanks for playing Dragon's Quest!")
         self.game_over = True
     
     def cmd_save(self):
         try:
-            save_data = {
-                "player": {
-                    "name": self.player.name,
-                    "health": self.player.health,
-                    "max_health": self.player.max_health,
-                    "attack": self.player.attack,
-                    "defense": self.player.defense,
-                    "level": self.player.level,
-                    "exp": self.player.exp,
-                    "exp_to_next": self.player.exp_to_next,
-                    "gold": self.player.gold,
-                    "location": self.player.location,
-                    "inventory": [item.__dict__ for item in self.player.inventory],
-                    "equipped_weapon": self.player.equipped_weapon.__dict__ if self.player.equipped_weapon else None,
-                    "equipped_armor": self.player.equipped_armor.__dict__ if self.player.equipped_armor else None,
-                }
-            }
-            
-            with open("dragonquest_save.json", "w") as f:
-                json.dump(save_data, f, indent=2)
-            print("Game saved successfully!")
+            if self.journal is None:
+                self.journal = SaveJournal(self.save_path, self)
+            self.journal.snapshot(self)
+            self.output("Game saved successfully!")
+            self.output("Progress will now be saved automatically every turn.")
         except Exception as e:
-            print(f"Failed to save game: {e}")
+            self.output(f"Failed to save game: {e}")
     
     def cmd_load(self):
         try:
-            with open("dragonquest_save.json", "r") as f:
-                save_data = json.load(f)
-            
-            player_data = save_data["player"]
-            self.player = Player(player_data["name"])
-            
-            # Restore player stats
-            for key, value in player_data.items():
-                if key in ["inventory", "equipped_weapon", "equipped_armor"]:
-                    continue
-                setattr(self.player, key, value)
-            
-            # Restore inventory
-            self.player.inventory = []
-            for item_data in player_data["inventory"]:
-                item = Item(**item_data)
-                self.player.inventory.append(item)
-            
-            # Restore equipped items
-            if player_data["equipped_weapon"]:
-                self.player.equipped_weapon = Item(**player_data["equipped_weapon"])
-            if player_data["equipped_armor"]:
-                self.player.equipped_armor = Item(**player_data["equipped_armor"])
+            # A save this session has not journaled to was made before it
+            saved_here = self.journal is not None
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if SaveJournal.exists(self.save_path):
+                self.journal = SaveJournal.restore(self, self.save_path)
+            else:
+                self._load_json_save(f"{self.save_path}_save.json")
+            if self.recorder is not None and not saved_here:
+                self.recorder.loaded_save(self.save_path)
             
-            print("Game loaded successfully!")
+            self.output("Game loaded successfully!")
             self.cmd_look()
         except FileNotFoundError:
-            print("No save file found.")
+            self.output("No save file found.")
         except Exception as e:
-            print(f"Failed to load game: {e}")
+            self.output(f"Failed to load game: {e}")
     
-    def _create_health_bar(self, current: int, maximum: int, length: int = 20):
+    def _load_json_save(self, path: str):
+        # Player-only saves written by earlier versions
+        with open(path, "r") as f:
+            save_data = json.load(f)
+        
+        player_data = save_data["player"]
+        self.player = Player(player_data["name"])
+        
+        # Restore player stats
+        for key, value in player_data.items():
+            if key in ["inventory", "equipped_weapon", "equipped_armor"]:
+                continue
+            setattr(self.player, key, value)
+        self.player.location = tuple(self.player.location)
+        
+        # Restore inventory from template keys
+        items_db = self.world.items_db
+        self.player.inventory = Inventory(items_db[item_key] for item_key in player_data["inventory"])
+        
+        # Restore equipped items
+        if player_data["equipped_weapon"]:
+            self.player.equipped_weapon = items_db[player_data["equipped_weapon"]]
+        if player_data["equipped_armor"]:
+            self.player.equipped_armor = items_db[player_data["equipped_armor"]]
+    
+    def _create_health_bar(self, current: int, maximum: int, length: int = HEALTH_BAR_LENGTH):
         if maximum <= 0:
             return "[ERROR]"
         
         filled = int((current / maximum) * length)
-        bar = "█" * filled + "░" * (length - filled)
         percentage = int((current / maximum) * 100)
         
         # Color coding for health
@@ -714,24 +2078,40 @@ class Game:
         else:
             color = "🔴"
         
-        return f"{color}[{bar}] {current}/{maximum}"
+        bar = HEALTH_BARS.get((filled, color)) if length == HEALTH_BAR_LENGTH else None
+        if bar is None:
+            bar = f"{color}[{'█' * filled}{'░' * (length - filled)}] "
+        return f"{bar}{current}/{maximum}"
     
-    def _create_exp_bar(self, current: int, maximum: int, length: int = 15):
+    def _create_exp_bar(self, current: int, maximum: int, length: int = EXP_BAR_LENGTH):
         if maximum <= 0:
             return "[ERROR]"
         
         filled = int((current / maximum) * length)
-        bar = "▓" * filled + "▒" * (length - filled)
         percentage = int((current / maximum) * 100)
         
-        return f"⭐[{bar}] {percentage}%"
+        bar = EXP_BARS.get(filled) if length == EXP_BAR_LENGTH else None
+        if bar is None:
+            bar = f"⭐[{'▓' * filled}{'▒' * (length - filled)}] "
+        return f"{bar}{percentage}%"
 
 # Additional game systems and features
 
 class QuestSystem:
+    """Quest log and progress tracking.
+    
+    Accepted quests are indexed by the (event type, target) that advances
+    them, e.g. ("kill", "goblin"), so an event only touches the quests that
+    are waiting for it however many are active.
+    """
+    # Quest type -> the EventBus event that advances it
+    EVENT_FOR_TYPE = {"kill": "kill", "collect": "pickup", "craft": "craft", "visit": "move"}
+    
     def __init__(self):
-        self.active_quests = []
+        self.active_quests = {}
         self.completed_quests = []
+        # (event type, target) -> ids of active quests advanced by it (a dict, to keep order)
+        self._watching = {}
         self.available_quests = {
             "goblin_slayer": {
                 "name": "Goblin Slayer",
@@ -762,8 +2142,79 @@ class QuestSystem:
                 "reward_gold": 1000,
                 "reward_exp": 500,
                 "current_count": 0
+            },
+            "apprentice_smith": {
+                "name": "Apprentice Smith",
+                "description": "Forge a steel sword at the crafting bench",
+                "type": "craft",
+                "target": "steel_sword",
+                "count": 1,
+                "reward_gold": 150,
+                "reward_exp": 60,
+                "current_count": 0
+            },
+            "ruin_explorer": {
+                "name": "Ruin Explorer",
+                "description": "Explore 3 ancient ruins",
+                "type": "visit",
+                "target": "ruins",
+                "count": 3,
+                "reward_gold": 80,
+                "reward_exp": 40,
+                "current_count": 0
             }
         }
+    
+    def find(self, name: str, quests: Dict[str, dict]) -> Optional[str]:
+        """The id of the quest in `quests` called `name` (by id or title), if any."""
+        name = name.strip().lower()
+        quest_id = name.replace(" ", "_")
+        if quest_id in quests:
+            return quest_id
+        return next((quest_id for quest_id, quest in quests.items() if quest["name"].lower() == name), None)
+    
+    def _keys(self, quest: dict):
+        targets = quest["target"] if isinstance(quest["target"], list) else [quest["target"]]
+        event_type = self.EVENT_FOR_TYPE[quest["type"]]
+        return [(event_type, target) for target in targets]
+    
+    def accept(self, quest_id: str) -> dict:
+        quest = dict(self.available_quests.pop(quest_id), current_count=0)
+        self.active_quests[quest_id] = quest
+        for key in self._keys(quest):
+            self._watching.setdefault(key, {})[quest_id] = None
+        return quest
+    
+    def _unwatch(self, quest_id: str, quest: dict):
+        for key in self._keys(quest):
+            watchers = self._watching[key]
+            del watchers[quest_id]
+            if not watchers:
+                del self._watching[key]
+    
+    def abandon(self, quest_id: str) -> dict:
+        quest = self.active_quests.pop(quest_id)
+        self._unwatch(quest_id, quest)
+        self.available_quests[quest_id] = dict(quest, current_count=0)
+        return quest
+    
+    def progress(self, event_type: str, target: str, count: int = 1) -> List[Tuple[str, dict]]:
+        """Advance the active quests waiting on this event and return them."""
+        watchers = self._watching.get((event_type, target))
+        if not watchers:
+            return []
+        advanced = []
+        for quest_id in watchers:
+            quest = self.active_quests[quest_id]
+            quest["current_count"] = min(quest["count"], quest["current_count"] + count)
+            advanced.append((quest_id, quest))
+        return advanced
+    
+    def complete(self, quest_id: str) -> dict:
+        quest = self.active_quests.pop(quest_id)
+        self._unwatch(quest_id, quest)
+        self.completed_quests.append(quest_id)
+        return quest
 
 class WeatherSystem:
     def __init__(self):
@@ -776,11 +2227,11 @@ class WeatherSystem:
             "snow": {"visibility": 0.7, "combat_modifier": 0.9, "description": "Soft snow drifts down from the sky."}
         }
     
-    def change_weather(self):
+    def change_weather(self, rng=random):
         weather_types = list(self.weather_effects.keys())
         # 70% chance to keep current weather, 30% to change
-        if random.random() < 0.3:
-            self.current_weather = random.choice(weather_types)
+        if rng.random() < 0.3:
+            self.current_weather = rng.choice(weather_types)
     
     def get_weather_description(self):
         return self.weather_effects[self.current_weather]["description"]
@@ -789,6 +2240,13 @@ class WeatherSystem:
         return self.weather_effects[self.current_weather]["combat_modifier"]
 
 class CraftingSystem:
+    """Recipes, and a planner that treats them as a dependency graph.
+    
+    A recipe's materials may themselves be crafted (iron_sword + ruby ->
+    steel_sword, steel_sword + diamond + ruby -> dragon_sword), so the
+    planner can craft intermediates on the way to a target. Plans are
+    cached until the inventory changes.
+    """
     def __init__(self):
         self.recipes = {
             "improved_sword": {
@@ -808,323 +2266,889 @@ class CraftingSystem:
                 "materials": {"health_potion": 2, "diamond": 1},
                 "result": "greater_health_potion",
                 "description": "Combine potions with diamond dust for greater effect"
+            },
+            "dragonforged_sword": {
+                "name": "Dragonforged Sword",
+                "materials": {"steel_sword": 1, "diamond": 1, "ruby": 1},
+                "result": "dragon_sword",
+                "description": "Temper a steel sword with a diamond and a ruby"
             }
         }
+        self._producers = None
+        self._plan_key = None
+        self._plan = None
+    
+    def _producer_of(self, item_key: str) -> Optional[str]:
+        if self._producers is None:
+            self._producers = {recipe["result"]: recipe_id for recipe_id, recipe in self.recipes.items()}
+        return self._producers.get(item_key)
+    
+    def _expand(self, recipe_id: str, times: int, available: Dict[str, int],
+                crafts: Dict[str, int], depth: int = 0) -> bool:
+        # Craft `recipe_id` `times` times out of `available`, first crafting
+        # any missing materials that have a recipe. Records the crafts made
+        # in `crafts` (dependencies first) and returns False if it can't.
+        if depth > len(self.recipes):
+            return False  # a cycle in the recipes
+        recipe = self.recipes[recipe_id]
+        for material, per_craft in recipe["materials"].items():
+            # Take each material as soon as it is there, so crafting a later
+            # material can't use it up again
+            needed = per_craft * times
+            missing = needed - available.get(material, 0)
+            if missing > 0:
+                producer = self._producer_of(material)
+                if producer is None or not self._expand(producer, missing, available, crafts, depth + 1):
+                    return False
+            if available.get(material, 0) < needed:
+                return False
+            available[material] -= needed
+        available[recipe["result"]] = available.get(recipe["result"], 0) + times
+        crafts[recipe_id] = crafts.get(recipe_id, 0) + times
+        return True
+    
+    def max_chain(self, recipe_id: str, counts: Dict[str, int]) -> Tuple[int, Dict[str, int]]:
+        """The most times `recipe_id` can be crafted from `counts`, crafting
+        intermediates as needed, and the crafts that takes."""
+        # Every recipe uses up at least two items to make one, so no more
+        # crafts than items held are possible; search that range
+        low, high = 0, sum(counts.values())
+        best = {}
+        while low < high:
+            middle = (low + high + 1) // 2
+            crafts = {}
+            if self._expand(recipe_id, middle, dict(counts), crafts):
+                low, best = middle, crafts
+            else:
+                high = middle - 1
+        return low, best
+    
+    def plan(self, inventory: "Inventory") -> Dict[str, Tuple[int, int, Dict[str, int]]]:
+        """recipe id -> (crafts possible from materials held, crafts possible
+        with intermediates crafted too, the crafts that takes)."""
+        key = (id(inventory), inventory.version)
+        if key == self._plan_key:
+            return self._plan
+        counts = {item.key: count for item, count in inventory.distinct()}
+        plan = {}
+        for recipe_id, recipe in self.recipes.items():
+            direct = min(counts.get(material, 0) // per_craft for material, per_craft in recipe["materials"].items())
+            chained, crafts = self.max_chain(recipe_id, counts)
+            plan[recipe_id] = (direct, chained, crafts)
+        self._plan_key, self._plan = key, plan
+        return plan
+
+# Exact combat odds, solved by dynamic programming over each side's health
+@dataclass(frozen=True)
+class CombatOdds:
+    win_probability: float
+    expected_rounds: float
+    expected_rounds_to_win: float
+
+@lru_cache(maxsize=None)
+def player_damage_distribution(attack: int, monster_defense: int, weather_modifier: float = 1.0):
+    rolls = 2 * PLAYER_DAMAGE_SPREAD + 1
+    distribution = {}
+    for base_damage in range(attack - PLAYER_DAMAGE_SPREAD, attack + PLAYER_DAMAGE_SPREAD + 1):
+        damage = max(1, int(base_damage * weather_modifier) - monster_defense)
+        for amount, chance in ((damage, 1 - CRIT_CHANCE), (damage * 2, CRIT_CHANCE)):
+            distribution[amount] = distribution.get(amount, 0.0) + chance / rolls
+    return tuple(sorted(distribution.items()))
+
+@lru_cache(maxsize=None)
+def monster_damage_distribution(monster_attack: int, player_defense: int, defending: bool = False):
+    rolls = 2 * MONSTER_DAMAGE_SPREAD + 1
+    distribution = {}
+    for damage in range(monster_attack - MONSTER_DAMAGE_SPREAD, monster_attack + MONSTER_DAMAGE_SPREAD + 1):
+        if defending:
+            damage = int(damage * DEFEND_FACTOR)
+        # Same as Player.take_damage
+        damage = max(1, damage - player_defense)
+        distribution[damage] = distribution.get(damage, 0.0) + 1 / rolls
+    return tuple(sorted(distribution.items()))
+
+# Identical monsters strike in batches of up to this many, one draw per batch
+STRIKE_BATCH = 32
+# Monsters listed with health bars each round of an encounter
+ENCOUNTER_LISTED = 8
+
+@lru_cache(maxsize=None)
+def group_damage_distribution(monster_attack: int, player_defense: int, defending: bool, count: int):
+    """(totals, cumulative weights) of the damage `count` identical monsters deal in one turn together."""
+    single = monster_damage_distribution(monster_attack, player_defense, defending)
+    total = {0: 1.0}
+    for _ in range(count):
+        combined = {}
+        for so_far, chance in total.items():
+            for damage, strike_chance in single:
+                combined[so_far + damage] = combined.get(so_far + damage, 0.0) + chance * strike_chance
+        total = combined
+    totals = sorted(total)
+    return totals, tuple(accumulate(total[damage] for damage in totals))
+
+# Blows-needed distributions kept for combat_odds, per (health, damage distribution)
+ODDS_CACHE_SIZE = 4096
+# Chances of being left on some health below this are dropped as the series
+# runs; the odds stay within about 1e-12 of exact
+ODDS_NEGLIGIBLE = 1e-15
+
+@lru_cache(maxsize=ODDS_CACHE_SIZE)
+def blows_to_fell(health: int, distribution: Tuple[Tuple[int, float], ...], limit: int) -> Tuple[float, ...]:
+    """Chance that exactly n blows drawn from `distribution` take `health` to zero, for n = 0 .. limit.
+    
+    The series ends early, with the rest taken as 0, once the chance of
+    going down within `limit` blows is negligible.
+    """
+    # standing[i]: chance of being left on low + i health and still up. Every
+    # blow does between lightest and heaviest, and the negligible edges are
+    # trimmed, so the band stays about as wide as the spread of the damage
+    # dealt so far rather than growing by the whole damage range each blow
+    lightest, heaviest = distribution[0][0], distribution[-1][0]
+    standing = [1.0]
+    felled = [0.0]
+    low = top = health
+    while low <= top and len(felled) <= limit:
+        base, end = max(1, low - heaviest), top - lightest
+        after = [0.0] * max(0, end - base + 1)
+        down = 0.0
+        for left, chance in enumerate(standing, low):
+            if not chance:
+                continue
+            for damage, blow_chance in distribution:
+                if damage >= left:
+                    down += chance * blow_chance
+                else:
+                    after[left - damage - base] += chance * blow_chance
+        felled.append(down)
+        # Health the blows left before `limit` can't take to zero doesn't matter either
+        first, last = 0, min(len(after), (limit - len(felled) + 1) * heaviest - base + 1) - 1
+        while first <= last and after[first] < ODDS_NEGLIGIBLE:
+            first += 1
+        while last >= first and after[last] < ODDS_NEGLIGIBLE:
+            last -= 1
+        standing = after[first:last + 1]
+        low, top = base + first, base + last
+    return tuple(felled)
+
+def combat_odds(player_hp: int, monster_hp: int, attack: int, player_defense: int,
+                monster_attack: int, monster_defense: int, weather_modifier: float = 1.0) -> CombatOdds:
+    """Odds of winning a fight where the player attacks every round, to within about 1e-12.
+    
+    The player's blows don't depend on the player's health and the monster's
+    don't depend on its own, so the fight splits into two one-dimensional
+    problems: how many hits the monster takes to fall (T) and how many
+    strikes the player takes (D). The player wins when T <= D, and the fight
+    lasts min(T, D) rounds. Each side's distribution is solved once per
+    (health, damage distribution) and kept in a bounded LRU cache, so a
+    repeated query is a single pass over the two distributions.
+    
+    A cold query costs blows x likely health values x damage rolls per
+    side. For the game's own monsters against a player of up to level 30
+    that is under a millisecond (0.7 ms at p99). Long, even fights between
+    hundreds of HP worn down a few points a blow are the slow case: about
+    10 ms at p99 for random stats up to 300 HP, and 60 ms up to 1000 HP.
+    """
+    if player_hp <= 0:
+        return CombatOdds(0.0, 0.0, 0.0)
+    if monster_hp <= 0:
+        return CombatOdds(1.0, 0.0, 0.0)
+    
+    hit_damage = player_damage_distribution(attack, monster_defense, weather_modifier)
+    strike_damage = monster_damage_distribution(monster_attack, player_defense)
+    # Nobody outlasts the most blows the weaker side can take, so neither series need go further
+    longest = min(-(-monster_hp // hit_damage[0][0]), -(-player_hp // strike_damage[0][0]))
+    # Solve the side expected to fall first, then the other only as far as
+    # the first is sure to have fallen by; past that its blows don't matter
+    monster_lasts = monster_hp / sum(damage * chance for damage, chance in hit_damage)
+    player_lasts = player_hp / sum(damage * chance for damage, chance in strike_damage)
+    if monster_lasts <= player_lasts:
+        hits = blows_to_fell(monster_hp, hit_damage, longest)
+        strikes = blows_to_fell(player_hp, strike_damage, min(longest, len(hits) - 1))
+    else:
+        strikes = blows_to_fell(player_hp, strike_damage, longest)
+        hits = blows_to_fell(monster_hp, hit_damage, min(longest, len(strikes) - 1))
+    win = rounds = win_rounds = 0.0
+    hits_left = 1.0  # P(T >= n)
+    standing = 1.0   # P(D >= n)
+    for n in range(1, longest + 1):
+        if n > 1:
+            standing -= strikes[n - 1] if n - 1 < len(strikes) else 0.0
+        if hits_left < ODDS_NEGLIGIBLE or standing < ODDS_NEGLIGIBLE:
+            break
+        # Past the end of a series, that side is sure to have fallen, or can't yet
+        hit = hits[n] if n < len(hits) else 0.0
+        rounds += hits_left * standing
+        win += hit * standing
+        win_rounds += n * hit * standing
+        hits_left -= hit
+    return CombatOdds(min(1.0, win), rounds, win_rounds / win if win else 0.0)
 
 # Enhanced Game class with additional systems
 def enhance_game_class():
     # Add new attributes to Game.__init__
     original_init = Game.__init__
     
-    def new_init(self):
-        original_init(self)
+    def new_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
         self.quest_system = QuestSystem()
         self.weather_system = WeatherSystem()
         self.crafting_system = CraftingSystem()
         self.turn_count = 0
-        
-        # Add new commands
-        self.commands.update({
-            "quests": self.cmd_quests,
-            "q": self.cmd_quests,
-            "weather": self.cmd_weather,
-            "craft": self.cmd_craft,
-            "recipes": self.cmd_recipes,
-            "time": self.cmd_time,
-            "rest": self.cmd_rest,
-        })
+        self.map_view = None
+        for event_type in set(QuestSystem.EVENT_FOR_TYPE.values()):
+            self.bus.subscribe(event_type, self.on_quest_event)
+        # Where this session has got to on the world's clock. Sessions sharing
+        # a world each have their own; the world keeps up with the furthest
+        self.world_turns = 0
+        self.world_clock = self.world.timers.now
+        self.woke_at = None
     
     Game.__init__ = new_init
+    
+    original_dispatch = Game._dispatch
+    
+    def ticking_dispatch(self, line: str):
+        original_dispatch(self, line)
+        if self.player is None or self.game_over:
+            return
+        location = self.player.location
+        if location != self.woke_at:
+            self.woke_at = location
+            self.world.wake(location, self.player.explored)
+        elapsed = self.turn_count - self.world_turns
+        self.world_turns = self.turn_count
+        if elapsed <= 0:  # nothing played, or an earlier save was loaded
+            return
+        # A world reset by a load starts its clock over at 0
+        now = self.world.timers.now
+        self.world_clock = min(self.world_clock, now) + elapsed
+        if self.world_clock > now:
+            arrivals = self.world.advance(self.world_clock - now)
+            if location in arrivals and not self.pending:
+                monsters = self.world.get_room(location).monsters
+                self.output(f"\n👣 Something stirs... {', '.join(monster.name for monster in monsters)} "
+                            f"{'is' if len(monsters) == 1 else 'are'} here!")
+    
+    Game._dispatch = ticking_dispatch
+    
+    # Add new commands
+    for spec in [
+        CommandSpec("quests", "cmd_quests", ("q",)),
+        CommandSpec("weather", "cmd_weather"),
+        CommandSpec("craft", "cmd_craft", takes_argument=True),
+        CommandSpec("recipes", "cmd_recipes"),
+        CommandSpec("time", "cmd_time"),
+        CommandSpec("rest", "cmd_rest"),
+        CommandSpec("odds", "cmd_odds"),
+        CommandSpec("perf", "cmd_perf", takes_argument=True),
+        CommandSpec("travel", "cmd_travel", takes_argument=True),
+        CommandSpec("map", "cmd_map"),
+        CommandSpec("accept", "cmd_accept", takes_argument=True),
+        CommandSpec("abandon", "cmd_abandon", takes_argument=True),
+    ]:
+        Game.grammar.add(spec)
 
 # New command methods for Game class
 def add_new_commands():
     def cmd_quests(self):
         if not self.quest_system.active_quests and not self.quest_system.available_quests:
-            print("No quests available.")
+            self.output("No quests available.")
             return
         
-        print("\n📋 Quest Log:")
+        self.output("\n📋 Quest Log:")
         
         if self.quest_system.active_quests:
-            print("\n   Active Quests:")
-            for quest_id, quest in self.quest_system.active_quests:
+            self.output("\n   Active Quests:")
+            for quest_id, quest in self.quest_system.active_quests.items():
                 progress = f"({quest['current_count']}/{quest['count']})"
-                print(f"   • {quest['name']} {progress}")
-                print(f"     {quest['description']}")
+                self.output(f"   • {quest['name']} {progress}")
+                self.output(f"     {quest['description']}")
         
         if self.quest_system.available_quests:
-            print("\n   Available Quests:")
+            self.output("\n   Available Quests:")
             for quest_id, quest in self.quest_system.available_quests.items():
                 reward_text = f"{quest['reward_gold']} gold, {quest['reward_exp']} exp"
-                print(f"   • {quest['name']} - Reward: {reward_text}")
-                print(f"     {quest['description']}")
+                self.output(f"   • {quest['name']} - Reward: {reward_text}")
+                self.output(f"     {quest['description']}")
         
         if self.quest_system.completed_quests:
-            print(f"\n   Completed Quests: {len(self.quest_system.completed_quests)}")
+            self.output(f"\n   Completed Quests: {len(self.quest_system.completed_quests)}")
+        if self.quest_system.available_quests:
+            self.output("\n   Use 'accept <quest>' to take on a quest.")
+    
+    def cmd_accept(self, quest_name: str = None):
+        if not quest_name:
+            self.output("Accept which quest? Use 'quests' to see what is available.")
+            return
+        quest_id = self.quest_system.find(quest_name, self.quest_system.available_quests)
+        if quest_id is None:
+            self.output("There is no such quest available.")
+            return
+        quest = self.quest_system.accept(quest_id)
+        self.output(f"📜 Quest accepted: {quest['name']}")
+        self.output(f"   {quest['description']}")
+    
+    def cmd_abandon(self, quest_name: str = None):
+        if not quest_name:
+            self.output("Abandon which quest?")
+            return
+        quest_id = self.quest_system.find(quest_name, self.quest_system.active_quests)
+        if quest_id is None:
+            self.output("You are not on that quest.")
+            return
+        quest = self.quest_system.abandon(quest_id)
+        self.output(f"You abandon {quest['name']}.")
+    
+    def on_quest_event(self, event_type: str, target: str, count: int = 1):
+        for quest_id, quest in self.quest_system.progress(event_type, target, count):
+            if quest["current_count"] < quest["count"]:
+                self.output(f"   📜 {quest['name']}: {quest['current_count']}/{quest['count']}")
+                continue
+            
+            self.quest_system.complete(quest_id)
+            self.player.gold += quest["reward_gold"]
+            self.player.exp += quest["reward_exp"]
+            self.output(f"\n🏆 Quest complete: {quest['name']}!")
+            self.output(f"   +{quest['reward_exp']} EXP, +{quest['reward_gold']} gold")
+            self.player.level_up(self.output, self.rng)
     
     def cmd_weather(self):
         weather_desc = self.weather_system.get_weather_description()
         combat_mod = self.weather_system.get_combat_modifier()
         
-        print(f"\n🌤️  Current Weather: {self.weather_system.current_weather.title()}")
-        print(f"   {weather_desc}")
+        self.output(f"\n🌤️  Current Weather: {self.weather_system.current_weather.title()}")
+        self.output(f"   {weather_desc}")
         
         if combat_mod != 1.0:
             modifier_text = "bonus" if combat_mod > 1.0 else "penalty"
             percentage = abs(int((combat_mod - 1.0) * 100))
-            print(f"   Combat {modifier_text}: {percentage}%")
+            self.output(f"   Combat {modifier_text}: {percentage}%")
     
     def cmd_craft(self, recipe_name: str = None):
         if not recipe_name:
-            print("What would you like to craft? Use 'recipes' to see available recipes.")
+            self.output("What would you like to craft? Use 'recipes' to see available recipes.")
+            return
+        
+        words = recipe_name.lower().split(None, 1)
+        if words[0] == "plan":
+            self.show_craft_plan()
+            return
+        if words[0] == "all":
+            if len(words) < 2:
+                self.output("Craft all of what? Use 'craft plan' to see what you can make.")
+                return
+            self.craft_all(words[1].replace(" ", "_"))
             return
         
         recipe_name = recipe_name.lower().replace(" ", "_")
         
         if recipe_name not in self.crafting_system.recipes:
-            print("Unknown recipe. Use 'recipes' to see available recipes.")
+            self.output("Unknown recipe. Use 'recipes' to see available recipes.")
             return
         
         recipe = self.crafting_system.recipes[recipe_name]
         
         # Check if player has required materials
-        player_items = {}
-        for item in self.player.inventory:
-            item_key = item.name.lower().replace(" ", "_")
-            player_items[item_key] = player_items.get(item_key, 0) + 1
-        
-        can_craft = True
-        for material, needed_count in recipe["materials"].items():
-            if player_items.get(material, 0) < needed_count:
-                can_craft = False
-                break
+        items_db = self.world.items_db
+        inventory = self.player.inventory
+        can_craft = all(inventory.count(items_db[material]) >= needed_count
+                        for material, needed_count in recipe["materials"].items())
         
         if not can_craft:
-            print(f"You don't have the required materials for {recipe['name']}:")
+            self.output(f"You don't have the required materials for {recipe['name']}:")
             for material, count in recipe["materials"].items():
-                have = player_items.get(material, 0)
+                have = inventory.count(items_db[material])
                 material_name = material.replace("_", " ").title()
-                print(f"   • {material_name}: {have}/{count}")
+                self.output(f"   • {material_name}: {have}/{count}")
             return
         
         # Remove materials from inventory
         for material, needed_count in recipe["materials"].items():
-            removed_count = 0
-            for item in self.player.inventory[:]:
-                item_key = item.name.lower().replace(" ", "_")
-                if item_key == material and removed_count < needed_count:
-                    self.player.inventory.remove(item)
-                    removed_count += 1
+            inventory.remove(items_db[material], needed_count)
         
         # Add crafted item
-        result_item = Item(**self.world.items_db[recipe["result"]].__dict__)
+        result_item = self.world.items_db[recipe["result"]]
         self.player.inventory.append(result_item)
         
-        print(f"✨ Successfully crafted {result_item.name}!")
+        self.output(f"✨ Successfully crafted {result_item.name}!")
+        self.bus.publish("craft", result_item.key)
+    
+    def show_craft_plan(self):
+        plan = self.crafting_system.plan(self.player.inventory)
+        self.output("\n🛠️ Crafting Plan:")
+        for recipe_id, (direct, chained, crafts) in plan.items():
+            recipe = self.crafting_system.recipes[recipe_id]
+            line = f"   • {recipe['name']} ({recipe_id}): {direct} now"
+            if chained > direct:
+                steps = ", ".join(f"{count}x {self.crafting_system.recipes[step]['name']}"
+                                  for step, count in crafts.items() if step != recipe_id)
+                line += f", {chained} by first crafting {steps}"
+            self.output(line)
+        self.output("Use 'craft all <recipe>' to craft as many as you can.")
+    
+    def craft_all(self, recipe_name: str):
+        crafting = self.crafting_system
+        if recipe_name not in crafting.recipes:
+            self.output("Unknown recipe. Use 'recipes' to see available recipes.")
+            return
+        _, chained, crafts = crafting.plan(self.player.inventory)[recipe_name]
+        if not chained:
+            self.output(f"You can't craft any {crafting.recipes[recipe_name]['name']} with what you have.")
+            return
+        
+        # The plan lists crafts dependencies first, so each batch's materials
+        # are in the inventory by the time it runs; check the whole plan
+        # before taking anything
+        items_db = self.world.items_db
+        inventory = self.player.inventory
+        counts = {item.key: count for item, count in inventory.distinct()}
+        for recipe_id, times in crafts.items():
+            recipe = crafting.recipes[recipe_id]
+            for material, needed_count in recipe["materials"].items():
+                counts[material] = counts.get(material, 0) - needed_count * times
+                if counts[material] < 0:
+                    self.output(f"You don't have enough {items_db[material].name} for that.")
+                    return
+            counts[recipe["result"]] = counts.get(recipe["result"], 0) + times
+        for recipe_id, times in crafts.items():
+            recipe = crafting.recipes[recipe_id]
+            for material, needed_count in recipe["materials"].items():
+                inventory.remove(items_db[material], needed_count * times)
+            result_item = items_db[recipe["result"]]
+            inventory.append(result_item, times)
+            self.output(f"✨ Successfully crafted {result_item.name} x{times}!")
+            self.bus.publish("craft", result_item.key, times)
     
     def cmd_recipes(self):
-        print("\n📖 Available Recipes:")
+        self.output("\n📖 Available Recipes:")
         for recipe_id, recipe in self.crafting_system.recipes.items():
-            print(f"\n   {recipe['name']}:")
-            print(f"   {recipe['description']}")
-            print(f"   Materials needed:")
+            self.output(f"\n   {recipe['name']}:")
+            self.output(f"   {recipe['description']}")
+            self.output(f"   Materials needed:")
             for material, count in recipe["materials"].items():
                 material_name = material.replace("_", " ").title()
-                print(f"     • {material_name} x{count}")
+                self.output(f"     • {material_name} x{count}")
+        self.output("\nUse 'craft plan' to see what you can make, and 'craft all <recipe>' to make as many as you can.")
     
     def cmd_time(self):
         time_of_day = ["Dawn", "Morning", "Midday", "Afternoon", "Evening", "Night"]
         current_time = time_of_day[self.turn_count % 6]
         
-        print(f"\n🕐 Time: {current_time}")
-        print(f"   Turns elapsed: {self.turn_count}")
+        self.output(f"\n🕐 Time: {current_time}")
+        self.output(f"   Turns elapsed: {self.turn_count}")
         
         # Show time-based effects
         if current_time in ["Evening", "Night"]:
-            print(f"   🌙 Monsters are more active during {current_time.lower()}.")
+            self.output(f"   🌙 Monsters are more active during {current_time.lower()}.")
         elif current_time == "Dawn":
-            print(f"   🌅 A new day begins. You feel refreshed.")
+            self.output(f"   🌅 A new day begins. You feel refreshed.")
     
     def cmd_rest(self):
         current_room = self.world.get_room(self.player.location)
-        if current_room and current_room['monsters']:
-            print("You cannot rest while enemies are nearby!")
+        if current_room and current_room.monsters:
+            self.output("You cannot rest while enemies are nearby!")
             return
         
-        if current_room and current_room['type'] != 'village':
-            if random.random() < 0.3:  # 30% chance of being interrupted
-                print("You try to rest, but strange noises keep you awake.")
+        if current_room and current_room.type != 'village':
+            if self.rng.random() < 0.3:  # 30% chance of being interrupted
+                self.output("You try to rest, but strange noises keep you awake.")
                 return
         
         # Resting restores some health and advances time
-        heal_amount = random.randint(10, 25)
+        heal_amount = self.rng.randint(10, 25)
         actual_heal = self.player.heal(heal_amount)
         self.turn_count += 2
-        self.weather_system.change_weather()
+        self.weather_system.change_weather(self.rng)
         
-        print(f"💤 You rest and recover {actual_heal} health.")
-        print("Time passes...")
+        self.output(f"💤 You rest and recover {actual_heal} health.")
+        self.output("Time passes...")
         
         # Small chance of finding something while resting in certain areas
-        if current_room and current_room['type'] in ['forest', 'ruins'] and random.random() < 0.1:
+        if current_room and current_room.type in ['forest', 'ruins'] and self.rng.random() < 0.1:
             found_items = ['health_potion', 'gold_coins']
-            found_item_key = random.choice(found_items)
-            found_item = Item(**self.world.items_db[found_item_key].__dict__)
+            found_item_key = self.rng.choice(found_items)
+            found_item = self.world.items_db[found_item_key]
             
             if found_item_key == 'gold_coins':
-                gold_amount = random.randint(5, 15)
+                gold_amount = self.rng.randint(5, 15)
                 self.player.gold += gold_amount
-                print(f"🪙 While resting, you found {gold_amount} gold coins!")
+                self.output(f"🪙 While resting, you found {gold_amount} gold coins!")
             else:
                 self.player.inventory.append(found_item)
-                print(f"🎁 While resting, you found a {found_item.name}!")
+                self.output(f"🎁 While resting, you found a {found_item.name}!")
+    
+    def cmd_map(self):
+        if self.map_view is None:
+            self.map_view = MapView(self)
+        x, y = self.player.location
+        self.output(f"\n🗺️  Map around ({x}, {y}) - {len(self.player.explored)} rooms explored")
+        rows = self.map_view.render()
+        border = "─" * (2 * self.map_view.width)
+        self.output(f"   ┌{border}┐")
+        for row in rows:
+            self.output(f"   │{row}│")
+        self.output(f"   └{border}┘")
+        self.output("   @ you  V village  ! monsters  ♣ forest  ^ mountain  ~ swamp  : desert  o cave")
+        self.output("   # ruins  D dungeon  T tower  L library  A armory  $ treasury  v empty village")
+    
+    def cmd_travel(self, destination: str = None):
+        usage = "Travel where? Use 'travel <x> <y>' or 'travel village'."
+        if not destination:
+            self.output(usage)
+            return
+        if destination == "village":
+            goal = (0, 0)
+        else:
+            try:
+                x, y = (int(part) for part in destination.replace(",", " ").split())
+            except ValueError:
+                self.output(usage)
+                return
+            goal = (x, y)
+        
+        if goal == self.player.location:
+            self.output("You are already there.")
+            return
+        current_room = self.world.get_room(self.player.location)
+        if current_room and current_room.monsters:
+            self.output("You cannot leave while enemies are present! Fight or flee!")
+            return
+        route = self.world.find_path(self.player.location, goal)
+        if route is None:
+            self.output("You cannot find a way there.")
+            return
+        
+        self.output(f"🧭 You set out for ({goal[0]}, {goal[1]}), {len(route)} rooms away...")
+        for steps, direction in enumerate(route, 1):
+            dx, dy = DIRECTION_OFFSETS[direction]
+            x, y = self.player.location
+            first_visit = (x + dx, y + dy) not in self.player.explored
+            self.player.location = (x + dx, y + dy)
+            room = self.world.get_room(self.player.location)
+            if first_visit:
+                self.bus.publish("move", room.type)
+            if room.monsters and steps < len(route):
+                # Same rule as cmd_go: nobody leaves a room with enemies in it
+                self.output(f"⚔️  Enemies block your way after {steps} room{'s' if steps > 1 else ''}!")
+                break
+        self.pause(self.move_delay)
+        self.cmd_look()
+    
+    def cmd_perf(self, option: str = None):
+        if option == "on":
+            if self.profiler is None:
+                self.profiler = CommandProfiler()
+            self.output("📈 Command profiling is on.")
+            return
+        if option == "off":
+            self.profiler = None
+            self.output("📈 Command profiling is off.")
+            return
+        if self.profiler is None:
+            self.output("Command profiling is off. Use 'perf on' to start it.")
+            return
+        if option == "reset":
+            self.profiler.reset()
+            self.output("📈 Command statistics cleared.")
+            return
+        
+        rows = self.profiler.report()
+        if not rows:
+            self.output("No commands profiled yet.")
+            return
+        self.output("\n📈 Command Performance:")
+        self.output(f"   {'Command':<16} {'Calls':>7} {'p50 ms':>8} {'p99 ms':>8} {'Total ms':>9} {'Alloc KiB':>10}")
+        for row in rows:
+            self.output(f"   {row['command']:<16} {row['calls']:>7} {row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} "
+                        f"{row['total_ms']:>9.1f} {row['alloc_bytes'] / 1024:>10.1f}")
+    
+    def cmd_odds(self):
+        current_room = self.world.get_room(self.player.location)
+        if not current_room or not current_room.monsters:
+            self.output("There are no enemies here.")
+            return
+        
+        monster = current_room.monsters[0]
+        odds = combat_odds(self.player.health, monster.health,
+                           self.player.get_total_attack(), self.player.defense,
+                           monster.attack, monster.defense,
+                           self.weather_system.get_combat_modifier())
+        
+        self.output(f"\n🎲 Odds against {monster.name}:")
+        self.output(f"   Win chance: {odds.win_probability * 100:.1f}%")
+        self.output(f"   Expected rounds: {odds.expected_rounds:.1f}")
+        if odds.win_probability > 0:
+            self.output(f"   Rounds to win: {odds.expected_rounds_to_win:.1f}")
     
     # Add methods to Game class
     Game.cmd_quests = cmd_quests
     Game.cmd_weather = cmd_weather
     Game.cmd_craft = cmd_craft
+    Game.show_craft_plan = show_craft_plan
+    Game.craft_all = craft_all
     Game.cmd_recipes = cmd_recipes
     Game.cmd_time = cmd_time
     Game.cmd_rest = cmd_rest
+    Game.cmd_odds = cmd_odds
+    Game.cmd_perf = cmd_perf
+    Game.cmd_travel = cmd_travel
+    Game.cmd_map = cmd_map
+    Game.cmd_accept = cmd_accept
+    Game.cmd_abandon = cmd_abandon
+    Game.on_quest_event = on_quest_event
 
 # Enhanced combat system
 def enhance_combat_system():
     original_fight = Game.cmd_fight
     
+    def monster_groups(monsters) -> Dict[int, list]:
+        # id(template) -> [template, number of them], in order of first appearance
+        groups = {}
+        for monster in monsters:
+            group = groups.get(id(monster.template))
+            if group is None:
+                groups[id(monster.template)] = [monster.template, 1]
+            else:
+                group[1] += 1
+        return groups
+    
+    def monsters_strike(self, groups: Dict[int, list], defending: bool):
+        # The monsters' turn, computed per group of identical monsters rather
+        # than per monster: a lone monster rolls its damage as always, larger
+        # groups draw their combined damage from the group's distribution
+        for template, count in groups.values():
+            if count == 1:
+                damage = self.rng.randint(template.attack - MONSTER_DAMAGE_SPREAD, template.attack + MONSTER_DAMAGE_SPREAD)
+                if defending:
+                    damage = int(damage * DEFEND_FACTOR)
+                actual_damage = self.player.take_damage(damage)
+                self.output(f"{template.name} attacks you for {actual_damage} damage!")
+                continue
+            
+            actual_damage = 0
+            for batch in range(0, count, STRIKE_BATCH):
+                totals, weights = group_damage_distribution(template.attack, self.player.defense, defending,
+                                                            min(STRIKE_BATCH, count - batch))
+                actual_damage += self.rng.choices(totals, cum_weights=weights)[0]
+            self.player.health -= actual_damage
+            self.output(f"{count}x {template.name} attack you for {actual_damage} damage!")
+    
     def enhanced_fight(self):
         current_room = self.world.get_room(self.player.location)
-        if not current_room or not current_room['monsters']:
-            print("There are no enemies to fight here.")
+        if not current_room or not current_room.monsters:
+            self.output("There are no enemies to fight here.")
             return
         
-        monster = current_room['monsters'][0]
+        # Every monster in the room takes part; the player picks which to attack
+        monster = current_room.monsters[0]
+        groups = monster_groups(current_room.monsters)
+        alive = len(current_room.monsters)
+        defeated = []
+        encounter_exp = encounter_gold = 0
+        self.world.mark_dirty(self.player.location)
         
         # Apply weather effects to combat
         weather_modifier = self.weather_system.get_combat_modifier()
         
-        print(f"\n⚔️  Battle begins with {monster.name}!")
-        print(f"   {monster.description}")
+        if alive == 1:
+            self.output(f"\n⚔️  Battle begins with {monster.name}!")
+            self.output(f"   {monster.description}")
+        else:
+            self.output(f"\n⚔️  Battle begins with {alive} enemies!")
+            self.output("   " + ", ".join(f"{count}x {template.name}" if count > 1 else template.name
+                                         for template, count in groups.values()))
         
         if weather_modifier != 1.0:
             weather_desc = self.weather_system.get_weather_description()
-            print(f"   Weather: {weather_desc}")
+            self.output(f"   Weather: {weather_desc}")
         
         combat_round = 1
         
-        while monster.health > 0 and self.player.health > 0:
-            print(f"\n--- Round {combat_round} ---")
-            print(f"{self.player.name}: {self._create_health_bar(self.player.health, self.player.max_health)}")
-            print(f"{monster.name}: {self._create_health_bar(monster.health, monster.max_health)}")
+        while current_room.monsters and self.player.health > 0:
+            monsters = current_room.monsters
+            if len(monsters) != alive:
+                # Another player in the room changed the line-up meanwhile
+                groups = monster_groups(monsters)
+                alive = len(monsters)
+                if monster not in monsters:
+                    monster = monsters[0]
             
-            action = input("\nChoose action: (a)ttack, (d)efend, (r)un, (u)se item: ").lower()
+            self.output(f"\n--- Round {combat_round} ---")
+            self.output(f"{self.player.name}: {self._create_health_bar(self.player.health, self.player.max_health)}")
+            if alive == 1:
+                self.output(f"{monster.name}: {self._create_health_bar(monster.health, monster.max_health)}")
+                prompt = "\nChoose action: (a)ttack, (d)efend, (r)un, (u)se item: "
+            else:
+                for i, enemy in enumerate(monsters[:ENCOUNTER_LISTED], 1):
+                    marker = "»" if enemy is monster else " "
+                    self.output(f"{marker}{i}. {enemy.name}: {self._create_health_bar(enemy.health, enemy.max_health)}")
+                if alive > ENCOUNTER_LISTED:
+                    self.output(f"   ...and {alive - ENCOUNTER_LISTED} more")
+                prompt = "\nChoose action: (a)ttack [#], (d)efend, (r)un, (u)se item: "
+            
+            action = (yield prompt).lower()
+            target_number = None
+            if action[:2] in ("a ", "at"):
+                # "a 2" / "attack 2" picks the target
+                words = action.split()
+                if len(words) == 2 and words[0] in ("a", "attack"):
+                    action, target_number = words
+            defend_this_turn = False
+            
+            # Another player in the room may have finished them off meanwhile
+            if not current_room.monsters:
+                self.output(f"{monster.name} has already been defeated." if alive == 1
+                            else "Your enemies have already been defeated.")
+                break
             
             if action == 'a' or action == 'attack':
+                if target_number is not None:
+                    try:
+                        index = int(target_number) - 1
+                        if index < 0:
+                            raise IndexError
+                        monster = current_room.monsters[index]
+                    except (ValueError, IndexError):
+                        self.output("Invalid target!")
+                        continue
+                
                 # Player attacks with weather modifier
-                base_damage = random.randint(self.player.get_total_attack() - 3, self.player.get_total_attack() + 3)
+                base_damage = self.rng.randint(self.player.get_total_attack() - PLAYER_DAMAGE_SPREAD,
+                                               self.player.get_total_attack() + PLAYER_DAMAGE_SPREAD)
                 modified_damage = int(base_damage * weather_modifier)
                 actual_damage = max(1, modified_damage - monster.defense)
                 
                 # Critical hit chance
-                if random.random() < 0.1:  # 10% crit chance
+                critical = self.rng.random() < CRIT_CHANCE
+                if critical:
                     actual_damage *= 2
-                    print(f"💥 CRITICAL HIT! You deal {actual_damage} damage to {monster.name}!")
-                else:
-                    print(f"You deal {actual_damage} damage to {monster.name}!")
                 
-                monster.health -= actual_damage
+                with self.world.room_lock(self.player.location):
+                    present = monster in current_room.monsters
+                    if present:
+                        monster.health -= actual_damage
+                        killed = monster.health <= 0
+                        if killed:
+                            current_room.remove_monster(monster)
+                        self.world.mark_dirty(self.player.location)
                 
-                if monster.health <= 0:
-                    print(f"\n🎉 You defeated {monster.name}!")
+                if not present:
+                    self.output(f"{monster.name} has already been defeated.")
+                    alive = None  # recount the room next round
+                    continue
+                if killed and not current_room.monsters:
+                    self.world.timers.schedule("respawn", self.player.location, RESPAWN_DELAY)
+                elif not killed and monster.regeneration:
+                    self.world.timers.schedule("regenerate", self.player.location, 1)
+                
+                if critical:
+                    self.output(f"💥 CRITICAL HIT! You deal {actual_damage} damage to {monster.name}!")
+                else:
+                    self.output(f"You deal {actual_damage} damage to {monster.name}!")
+                
+                if killed:
+                    self.output(f"\n🎉 You defeated {monster.name}!")
+                    defeated.append(monster)
+                    alive -= 1
+                    group = groups[id(monster.template)]
+                    group[1] -= 1
+                    if not group[1]:
+                        del groups[id(monster.template)]
                     
                     # Enhanced rewards
                     base_exp = monster.exp_value
-                    base_gold = random.randint(*monster.gold_drop)
+                    base_gold = self.rng.randint(*monster.gold_drop)
                     
                     # Bonus for quick victory
                     if combat_round <= 3:
                         exp_bonus = int(base_exp * 0.2)
                         gold_bonus = int(base_gold * 0.3)
-                        print(f"   ⚡ Quick Victory Bonus!")
+                        self.output(f"   ⚡ Quick Victory Bonus!")
                         base_exp += exp_bonus
                         base_gold += gold_bonus
                     
                     self.player.exp += base_exp
                     self.player.gold += base_gold
-                    print(f"   +{base_exp} EXP, +{base_gold} gold")
+                    encounter_exp += base_exp
+                    encounter_gold += base_gold
+                    self.output(f"   +{base_exp} EXP, +{base_gold} gold")
                     
                     # Chance to find loot
-                    if random.random() < 0.3:
+                    if self.rng.random() < 0.3:
                         loot_items = ['health_potion', 'ruby', 'iron_sword', 'leather_armor']
-                        loot = random.choice(loot_items)
-                        found_item = Item(**self.world.items_db[loot].__dict__)
+                        loot = self.rng.choice(loot_items)
+                        found_item = self.world.items_db[loot]
                         self.player.inventory.append(found_item)
-                        print(f"   🎁 You found {found_item.name}!")
+                        self.output(f"   🎁 You found {found_item.name}!")
+                        self.bus.publish("pickup", found_item.key)
                     
-                    current_room['monsters'].remove(monster)
-                    self.player.level_up()
-                    self.turn_count += 1
-                    return
+                    self.player.level_up(self.output, self.rng)
+                    self.bus.publish("kill", monster.key)
+                    
+                    if current_room.monsters:
+                        monster = current_room.monsters[0]
             
             elif action == 'd' or action == 'defend':
-                print("You raise your guard, reducing incoming damage this turn.")
+                self.output("You raise your guard, reducing incoming damage this turn.")
                 defend_this_turn = True
             
             elif action == 'r' or action == 'run':
-                escape_chance = 0.7 - (monster.attack / 100)  # Harder to escape from strong monsters
-                if random.random() < escape_chance:
-                    print("You successfully fled from battle!")
-                    self.turn_count += 1
-                    return
+                # The most dangerous enemy decides how hard it is to get away
+                strongest = max(template.attack for template, _ in groups.values())
+                if self.rng.random() < escape_chance(strongest):
+                    self.output("You successfully fled from battle!")
+                    break
                 else:
-                    print("You failed to escape!")
+                    self.output("You failed to escape!")
             
             elif action == 'u' or action == 'use':
-                potions = [item for item in self.player.inventory if item.type == ItemType.POTION]
+                potions = [(item, count) for item, count in self.player.inventory.distinct()
+                           if item.type == ItemType.POTION]
                 if not potions:
-                    print("You have no potions to use!")
+                    self.output("You have no potions to use!")
                     continue
                 
-                print("Available potions:")
-                for i, potion in enumerate(potions):
-                    print(f"   {i + 1}. {potion.name}")
+                self.output("Available potions:")
+                for i, (potion, count) in enumerate(potions):
+                    quantity = f" x{count}" if count > 1 else ""
+                    self.output(f"   {i + 1}. {potion.name}{quantity}")
                 
                 try:
-                    choice = int(input("Choose potion (number): ")) - 1
+                    choice = int((yield "Choose potion (number): ")) - 1
                     if 0 <= choice < len(potions):
-                        potion = potions[choice]
+                        potion = potions[choice][0]
                         healed = self.player.heal(potion.effect)
                         self.player.inventory.remove(potion)
-                        print(f"You used {potion.name} and restored {healed} health!")
+                        self.output(f"You used {potion.name} and restored {healed} health!")
                     else:
-                        print("Invalid choice!")
+                        self.output("Invalid choice!")
                         continue
                 except ValueError:
-                    print("Invalid input!")
+                    self.output("Invalid input!")
                     continue
             else:
-                print("Invalid action!")
+                self.output("Invalid action!")
                 continue
             
-            # Monster's turn
-            if monster.health > 0:
-                damage = random.randint(monster.attack - 2, monster.attack + 2)
-                
-                # Apply defend reduction
-                if 'defend_this_turn' in locals() and defend_this_turn:
-                    damage = int(damage * 0.5)
-                    print(f"{monster.name} attacks, but your defense reduces the damage!")
-                    defend_this_turn = False
-                
-                actual_damage = self.player.take_damage(damage)
-                print(f"{monster.name} attacks you for {actual_damage} damage!")
+            # Monsters' turn
+            if groups:
+                if defend_this_turn:
+                    if alive == 1:
+                        self.output(f"{monster.name} attacks, but your defense reduces the damage!")
+                    else:
+                        self.output("Your enemies attack, but your defense reduces the damage!")
+                self.monsters_strike(groups, defend_this_turn)
                 
                 if self.player.health <= 0:
                     return
             
             combat_round += 1
         
+        if len(defeated) > 1:
+            self.output(f"\n🏆 {len(defeated)} enemies defeated: +{encounter_exp} EXP, +{encounter_gold} gold in all")
         self.turn_count += 1
     
+    Game.monsters_strike = monsters_strike
     Game.cmd_fight = enhanced_fight
 
 # Initialize the enhanced game systems
@@ -1146,5 +3170,31 @@ if __name__ == "__main__":
     print("• Procedurally generated world to explore")
     print("=" * 60)
     
-    game = Game()
-    game.start_game()
+    parser = argparse.ArgumentParser(description="Dragon's Quest RPG")
+    parser.add_argument("--world", metavar="PATH", help="play in a memory-mapped world made by roomstore.py")
+    parser.add_argument("--record", metavar="PATH", help="record the session for replay.py")
+    parser.add_argument("--profile", metavar="PATH", help="profile commands and write the statistics here on exit")
+    args = parser.parse_args()
+    
+    world = None
+    if args.world:
+        from roomstore import MappedRoomStore
+        world = GameWorld(store=MappedRoomStore.open(args.world))
+    game = Game(world)
+    if args.profile:
+        game.profiler = CommandProfiler()
+    recorder = None
+    if args.record:
+        from replay import SessionRecorder
+        recorder = SessionRecorder(args.record, game)
+    try:
+        game.start_game()
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if args.profile and game.profiler is not None:
+            game.profiler.dump(args.profile)
+        # Flush the session's world, which is the one the store is bound to
+        if game.world.store is not None:
+            game.world.flush()
+            game.world.store.close()
@@ -0,0 +1,202 @@
+"""Record Dragon's Quest sessions and replay them headlessly.
+
+A recording is a JSON-lines file: a header with the world's seed, radius
+and chunk settings and the session's RNG seed, then every line the player
+typed (the name, commands, and answers to combat, potion and shop prompts)
+with the time it was typed, then a footer with a checksum of the final
+state. The engine draws every random outcome from the session's own RNG,
+so replaying the same lines against a fresh world of the same seed
+reproduces the session exactly. Replays run in turbo mode with all output
+discarded, and saves go to a temporary directory.
+
+Some sessions can't be reproduced from their inputs alone:
+
+- A session recorded on a shared server only replays exactly if no other
+  player changed the rooms it visited.
+- A session played in a room store (--world) replays against a fresh store
+  of the same seed, so rooms changed there by earlier sessions are lost.
+- A session that loads a save made before the recording started is marked
+  in the recording, and replay() refuses it.
+
+    python main.py --record session.dqrec
+    python replay.py session.dqrec --repeat 100
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from main import Game, GameWorld
+
+FORMAT_VERSION = 1
+
+@dataclass
+class Recording:
+    world_seed: int
+    radius: Optional[int]
+    rng_seed: int
+    lines: List[Tuple[float, str]]  # (seconds since recording started, line typed)
+    checksum: Optional[str] = None  # None if the recording was cut off
+    chunk_size: int = 16
+    max_chunks: int = 64
+    store: bool = False  # played in a room store world
+    loaded_save: bool = False  # loaded a save from before the recording started
+
+    @property
+    def duration(self) -> float:
+        return self.lines[-1][0] if self.lines else 0.0
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {FORMAT_VERSION} session recording")
+            recording = cls(header["world_seed"], header["radius"], header["rng_seed"], [],
+                            chunk_size=header.get("chunk_size", 16), max_chunks=header.get("max_chunks", 64),
+                            store=header.get("store", False))
+            for row in f:
+                entry = json.loads(row)
+                if isinstance(entry, dict):
+                    if "loaded_save" in entry:
+                        recording.loaded_save = True
+                    else:
+                        recording.checksum = entry["checksum"]
+                else:
+                    recording.lines.append((entry[0], entry[1]))
+        return recording
+
+class SessionRecorder:
+    """Writes everything typed into a Game to a recording file.
+
+    Attach it before the session begins; it hooks Game.begin and Game.handle
+    through `game.recorder`. Each line is flushed as it is written so a
+    crashed session still leaves a usable recording.
+    """
+    def __init__(self, path: str, game: Game):
+        if game.player is not None:
+            raise ValueError("start recording before the session begins")
+        self.path = path
+        self.game = game
+        self._start = time.monotonic()
+        self._file = open(path, "w", encoding="utf-8")
+        world = game.world
+        self._write({"version": FORMAT_VERSION, "world_seed": world.seed, "radius": world.radius,
+                     "chunk_size": world.chunk_size, "max_chunks": world.max_chunks,
+                     "store": world.store is not None, "rng_seed": game.rng_seed})
+        game.recorder = self
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def record(self, line: str):
+        self._write([round(time.monotonic() - self._start, 3), line])
+
+    def loaded_save(self, path: str):
+        """Note that the session loaded a save it did not write, which a replay can't reproduce."""
+        self._write({"loaded_save": path})
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.game.player is not None:
+            self._write({"checksum": state_checksum(self.game)})
+        self._file.close()
+        self.game.recorder = None
+
+def state_checksum(game: Game) -> str:
+    """SHA-256 of the player, the session clock and weather, and every changed room."""
+    player = game.player
+    rooms = sorted(
+        [list(location), room.type, room.special,
+         [[monster.name, monster.health] for monster in room.monsters],
+         sorted([item.key, count] for item, count in room.items.distinct()) if room.items else []]
+        for location, room in game.world.modified_rooms()
+    )
+    state = [
+        player.name, player.health, player.max_health, player.attack, player.defense,
+        player.level, player.exp, player.exp_to_next, player.gold, list(player.location),
+        player.equipped_weapon.key if player.equipped_weapon else None,
+        player.equipped_armor.key if player.equipped_armor else None,
+        sorted([item.key, count] for item, count in player.inventory.distinct()),
+        game.turn_count, game.weather_system.current_weather, game.game_over,
+        rooms,
+    ]
+    return hashlib.sha256(json.dumps(state, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def replay(recording: Recording, save_dir: Optional[str] = None) -> Game:
+    """Play a recording back against a fresh world and return the finished Game.
+
+    Saves made during the replay go to `save_dir` (a temporary directory by
+    default) rather than over the player's real save. Raises ValueError for
+    a recording that loaded a save from before it started.
+    """
+    if recording.loaded_save:
+        raise ValueError("the session loaded a save made before it was recorded")
+    with tempfile.TemporaryDirectory() as temporary:
+        store = None
+        if recording.store:
+            from roomstore import MappedRoomStore
+            store = MappedRoomStore.create(os.path.join(temporary, "world.dqr"), recording.radius,
+                                           recording.world_seed)
+        world = GameWorld(recording.radius, recording.chunk_size, recording.max_chunks, recording.world_seed,
+                          store=store)
+        game = Game(world)
+        game.turbo = True
+        game.rng_seed = recording.rng_seed
+        game.rng.seed(recording.rng_seed)
+        game.save_path = os.path.join(save_dir or temporary, "replay")
+        try:
+            lines = iter(line for _, line in recording.lines)
+            name = next(lines, None)
+            if name is None:
+                return game
+            game.begin(name)
+            for line in lines:
+                game.handle(line)
+        finally:
+            if game.journal is not None:
+                game.journal.close()
+            if store is not None:
+                store.close()
+    return game
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Dragon's Quest sessions")
+    parser.add_argument("recordings", nargs="+")
+    parser.add_argument("--repeat", type=int, default=1, help="replay each recording this many times")
+    args = parser.parse_args()
+
+    failures = 0
+    for path in args.recordings:
+        recording = Recording.load(path)
+        start = time.perf_counter()
+        try:
+            for _ in range(args.repeat):
+                checksum = state_checksum(replay(recording))
+        except ValueError as e:
+            print(f"{path}: cannot replay: {e}")
+            failures += 1
+            continue
+        elapsed = (time.perf_counter() - start) / args.repeat
+        speedup = recording.duration / elapsed if elapsed else float("inf")
+        if recording.checksum is None:
+            verdict = "no stored checksum"
+        elif checksum == recording.checksum:
+            verdict = "OK"
+        else:
+            verdict = f"MISMATCH (recorded {recording.checksum[:16]})"
+            failures += 1
+        print(f"{path}: {len(recording.lines)} inputs in {elapsed * 1000:.1f}ms "
+              f"({recording.duration:.0f}s recorded, {speedup:,.0f}x real time) "
+              f"checksum {checksum[:16]} {verdict}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Memory-mapped room store for very large worlds.
+
+A bounded world of radius R is laid out as one fixed-size record per room in
+a (2R+1) x (2R+1) grid inside a single file. The file is created sparse and
+mapped with mmap, so opening it is instant however large the world is, and
+only the pages of rooms that are actually read or written take up memory or
+disk. Rooms nobody has visited read back as empty records and are generated
+from the world seed on first use, then written into their slot.
+
+    python roomstore.py world.dqr --radius 5000 --seed 42   # 100M rooms
+    python main.py --world world.dqr
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+from typing import Optional, Tuple
+
+from main import (
+    ROOM_DESCRIPTIONS, ROOM_TYPES, VILLAGE_DESCRIPTION,
+    GameWorld, Inventory, MonsterInstance, Room,
+)
+
+class MappedRoomStore:
+    """Fixed-size room records in a memory-mapped file.
+
+    Each record holds the room type, its special tag, up to MONSTER_SLOTS
+    monsters as (template id, health) and up to ITEM_SLOTS item stacks as
+    (template id, count). Rooms that do not fit (more monsters or stacks, or
+    counts too large) are refused by put() and the world keeps them in its
+    spill file instead.
+
+    `modified` is the set of locations written back after being changed in
+    play, as opposed to freshly generated ones.
+    """
+    MAGIC = b"DQRM"
+    HEADER = struct.Struct("<4sqiI")  # magic, world seed, world radius, record size
+    MONSTER_SLOTS, ITEM_SLOTS = 4, 2
+    # type id + 1 (0 = not generated yet), special id, monster count, item count,
+    # then the monster and item slots
+    RECORD = struct.Struct("<BBBB" + "BxH" * MONSTER_SLOTS + "BxH" * ITEM_SLOTS + "4x")
+    TYPES = ROOM_TYPES + [t for t in ("village",) if t not in ROOM_TYPES]
+    SPECIALS = [None, "shop"]
+
+    def __init__(self, path: str, mode: str = "r+b"):
+        self.path = path
+        self._file = open(path, mode)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        if hasattr(mmap, "MADV_RANDOM"):
+            # Rooms are read one record at a time in no particular order; without
+            # this the kernel reads ahead around every page fault, and resident
+            # memory grows far faster than the rooms touched
+            self._map.madvise(mmap.MADV_RANDOM)
+        self._view = memoryview(self._map)
+        magic, self.seed, self.radius, record_size = self.HEADER.unpack_from(self._view)
+        if magic != self.MAGIC or record_size != self.RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a Dragon's Quest room store")
+        self.side = 2 * self.radius + 1
+        self.modified = set()
+        self._type_ids = {name: i for i, name in enumerate(self.TYPES)}
+        self._special_ids = {name: i for i, name in enumerate(self.SPECIALS)}
+        self._monsters = self._monster_ids = self._items = self._item_ids = None
+
+    @classmethod
+    def create(cls, path: str, radius: int, seed: int) -> "MappedRoomStore":
+        """Create an empty store for a world of the given radius and seed."""
+        side = 2 * radius + 1
+        with open(path, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, seed, radius, cls.RECORD.size))
+            # Sparse: no room data is written until a room is generated
+            f.truncate(cls.HEADER.size + side * side * cls.RECORD.size)
+        return cls(path)
+
+    @classmethod
+    def open(cls, path: str) -> "MappedRoomStore":
+        return cls(path)
+
+    def bind(self, world: GameWorld):
+        """Take the monster and item template ids from the world using this store."""
+        self._monsters = list(world.monsters_db.values())
+        self._monster_ids = {monster.name: i for i, monster in enumerate(self._monsters)}
+        self._items = list(world.items_db.values())
+        self._item_ids = {item.key: i for i, item in enumerate(self._items)}
+
+    def _offset(self, location: Tuple[int, int]) -> int:
+        x, y = location
+        return self.HEADER.size + ((x + self.radius) * self.side + (y + self.radius)) * self.RECORD.size
+
+    def get(self, location: Tuple[int, int]) -> Optional[Room]:
+        """The stored room at `location`, or None if it was never generated."""
+        fields = self.RECORD.unpack_from(self._view, self._offset(location))
+        type_id, special_id, monster_count, item_count = fields[:4]
+        if not type_id:
+            return None
+        room_type = self.TYPES[type_id - 1]
+        special = self.SPECIALS[special_id]
+        if room_type == "village" and special == "shop":
+            description = VILLAGE_DESCRIPTION
+        else:
+            description = ROOM_DESCRIPTIONS.get(room_type, "A mysterious location.")
+        room = Room(room_type, description, special)
+
+        slots = fields[4:]
+        for i in range(monster_count):
+            room.add_monster(MonsterInstance(self._monsters[slots[2 * i]], slots[2 * i + 1]))
+        if item_count:
+            slots = fields[4 + 2 * self.MONSTER_SLOTS:]
+            room.items = Inventory()
+            for i in range(item_count):
+                room.items.append(self._items[slots[2 * i]], slots[2 * i + 1])
+        return room
+
+    def put(self, location: Tuple[int, int], room: Room, modified: bool = False) -> bool:
+        """Write `room` into its slot. Returns False if it does not fit a record."""
+        stacks = room.items.distinct() if room.items else []
+        if (len(room.monsters) > self.MONSTER_SLOTS or len(stacks) > self.ITEM_SLOTS
+                or any(not 0 < monster.health <= 0xFFFF for monster in room.monsters)
+                or any(count > 0xFFFF for _, count in stacks)):
+            return False
+
+        slots = []
+        for monster in room.monsters:
+            slots += (self._monster_ids[monster.name], monster.health)
+        slots += (0, 0) * (self.MONSTER_SLOTS - len(room.monsters))
+        for item, count in stacks:
+            slots += (self._item_ids[item.key], count)
+        slots += (0, 0) * (self.ITEM_SLOTS - len(stacks))
+        self.RECORD.pack_into(self._view, self._offset(location),
+                              self._type_ids[room.type] + 1, self._special_ids[room.special],
+                              len(room.monsters), len(stacks), *slots)
+        if modified:
+            self.modified.add(location)
+        return True
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        if self._map is None:
+            return
+        self._view.release()
+        self._map.close()
+        self._file.close()
+        self._map = None
+
+def prebuild(world: GameWorld, radius: int, progress=print):
+    """Generate every room within `radius` of the village into the world's store."""
+    store = world.store
+    start = time.perf_counter()
+    for x in range(-radius, radius + 1):
+        for y in range(-radius, radius + 1):
+            if store.get((x, y)) is None:
+                store.put((x, y), world._generate_room_at((x, y)))
+        if progress and (x + radius) % 100 == 99:
+            progress(f"  {x + radius + 1}/{2 * radius + 1} columns, {time.perf_counter() - start:.1f}s")
+    store.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a memory-mapped Dragon's Quest world")
+    parser.add_argument("path")
+    parser.add_argument("--radius", type=int, default=1000, help="world spans -radius..radius on both axes")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--prebuild", type=int, default=0, metavar="R",
+                        help="generate all rooms within R of the village up front")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else GameWorld().seed
+    store = MappedRoomStore.create(args.path, args.radius, seed)
+    world = GameWorld(store=store)
+    side = 2 * args.radius + 1
+    print(f"🗺️ {args.path}: {side * side:,} rooms, seed {seed}, "
+          f"{os.path.getsize(args.path) / 2 ** 20:,.0f} MiB (sparse)")
+    if args.prebuild:
+        prebuild(world, min(args.prebuild, args.radius))
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Multi-player Dragon's Quest server.
+
+A telnet-style line protocol over asyncio: every connection gets its own
+Player and Game session, and all sessions share one GameWorld.
+
+    python server.py --port 4000
+    telnet localhost 4000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+from typing import List, Optional
+from urllib.parse import quote
+
+from main import CommandProfiler, Game, GameEvent, GameWorld
+
+class GameServer:
+    def __init__(self, world: Optional[GameWorld] = None, host: str = "127.0.0.1", port: int = 4000,
+                 turbo: bool = False, record_dir: Optional[str] = None,
+                 profiler: Optional[CommandProfiler] = None, save_dir: str = "saves"):
+        self.world = world if world is not None else GameWorld()
+        self.host = host
+        self.port = port
+        self.turbo = turbo
+        # If set, every session is recorded to its own file for replay.py
+        self.record_dir = record_dir
+        # Every character saves to its own file here, named after the character
+        self.save_dir = save_dir
+        self._session_ids = itertools.count(1)
+        # One profiler shared by every session, so it shows the whole server's load
+        self.profiler = profiler
+        self.sessions = set()
+        self._tasks = set()
+        self.commands_handled = 0
+        self._server = None
+
+    async def start(self):
+        os.makedirs(self.save_dir, exist_ok=True)
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        # Port 0 picks a free port; report the real one
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        game = Game(self.world)
+        game.turbo = self.turbo
+        game.shared_world = True
+        game.profiler = self.profiler
+        recorder = None
+        if self.record_dir is not None:
+            from replay import SessionRecorder
+            path = os.path.join(self.record_dir, f"session-{next(self._session_ids)}.dqrec")
+            recorder = SessionRecorder(path, game)
+        task = asyncio.current_task()
+        self.sessions.add(game)
+        self._tasks.add(task)
+        try:
+            writer.write(b"Welcome to Dragon's Quest!\r\nEnter your character's name: ")
+            name = await reader.readline()
+            if not name:
+                return
+            events = game.begin(name.decode("utf-8", "replace"))
+            game.save_path = self.save_path(game.player.name)
+            await self._send(writer, game, events)
+
+            while not game.game_over:
+                line = await reader.readline()
+                if not line:
+                    break
+                await self._send(writer, game, game.handle(line.decode("utf-8", "replace")))
+                self.commands_handled += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutdown; let the connection close normally
+            pass
+        finally:
+            self.sessions.discard(game)
+            self._tasks.discard(task)
+            # A client that drops mid-fight would otherwise leave its room
+            # busy and its chunk pinned until the Game is garbage collected
+            if game.pending is not None:
+                game.pending.close()
+                game.pending = None
+            if game.journal is not None:
+                game.journal.close()
+                game.journal = None
+            if recorder is not None:
+                recorder.close()
+            writer.close()
+
+    def save_path(self, name: str) -> str:
+        # Quoting keeps any name a safe, distinct file name
+        return os.path.join(self.save_dir, quote(name.lower(), safe=""))
+
+    async def _send(self, writer: asyncio.StreamWriter, game: Game, events: List[GameEvent]):
+        # One write per command, split only where the game asks for a pause;
+        # pauses sleep this session without holding up any other
+        lines = []
+        prompt = None
+        for event in events:
+            if event.kind == "message":
+                lines.append(event.text)
+            elif event.kind == "prompt":
+                prompt = event.text
+            elif event.kind == "pause":
+                self._write(writer, lines + [""])
+                lines = []
+                await writer.drain()
+                await asyncio.sleep(event.duration)
+        if not game.game_over:
+            lines.append(prompt if prompt is not None else f"\n[{game.player.name}] > ")
+        self._write(writer, lines)
+        await writer.drain()
+    
+    def _write(self, writer: asyncio.StreamWriter, lines: List[str]):
+        if lines:
+            writer.write("\n".join(lines).replace("\n", "\r\n").encode("utf-8"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Dragon's Quest multi-player server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--turbo", action="store_true", help="skip cosmetic pauses such as travel time")
+    parser.add_argument("--record-dir", metavar="DIR", help="record every session for replay.py")
+    parser.add_argument("--save-dir", metavar="DIR", default="saves", help="where each character's save is kept")
+    parser.add_argument("--profile", metavar="PATH", help="profile commands and write the statistics here on exit")
+    args = parser.parse_args()
+
+    if args.record_dir:
+        os.makedirs(args.record_dir, exist_ok=True)
+    profiler = CommandProfiler() if args.profile else None
+    server = GameServer(GameWorld(seed=args.seed), args.host, args.port, args.turbo, args.record_dir, profiler,
+                        args.save_dir)
+    print(f"🐉 Dragon's Quest server listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if profiler is not None:
+            profiler.dump(args.profile)
+
+if __name__ == "__main__":
+    main()